@@ -8,6 +8,9 @@ class Config:
     # API Keys
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     
+    # Language Model
+    LM_MODEL = os.getenv("LM_MODEL", "openai/gpt-4o-mini")
+    
     # Milvus Config
     MILVUS_HOST = os.getenv("MILVUS_HOST", "localhost")
     MILVUS_PORT = os.getenv("MILVUS_PORT", "19530")
@@ -16,6 +19,112 @@ class Config:
     # Embedding Model
     EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
     
+    # Reranker ("llm" uses the EvidenceRanker LM call, "cross_encoder" scores locally on CPU, "vector" keeps Milvus order)
+    RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "llm")
+    CROSS_ENCODER_MODEL_NAME = os.getenv("CROSS_ENCODER_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANKER_TOP_N = int(os.getenv("RERANKER_TOP_N", "5"))
+    RERANKER_SCORE_CUTOFF = float(os.getenv("RERANKER_SCORE_CUTOFF", "-10.0"))
+    RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "8"))
+    RERANKER_MAX_WORKERS = int(os.getenv("RERANKER_MAX_WORKERS", "2"))
+    
+    # Ranking cascade (squared L2 distances from Milvus; lower is closer)
+    RANKING_CASCADE_ENABLED = os.getenv("RANKING_CASCADE_ENABLED", "true").lower() == "true"
+    CASCADE_SKIP_GAP = float(os.getenv("CASCADE_SKIP_GAP", "0.3"))
+    CASCADE_LOCAL_GAP = float(os.getenv("CASCADE_LOCAL_GAP", "0.1"))
+    CASCADE_MAX_DISTANCE = float(os.getenv("CASCADE_MAX_DISTANCE", "1.0"))
+    
+    # Fast path: simple queries skip the QueryUnderstanding LM call
+    FASTPATH_ENABLED = os.getenv("FASTPATH_ENABLED", "true").lower() == "true"
+    FASTPATH_MAX_WORDS = int(os.getenv("FASTPATH_MAX_WORDS", "6"))
+    FASTPATH_SIMILARITY_MARGIN = float(os.getenv("FASTPATH_SIMILARITY_MARGIN", "0.05"))
+    
+    # Speculative retrieval on the raw query while the rewrite is in flight
+    SPECULATIVE_RETRIEVAL_ENABLED = os.getenv("SPECULATIVE_RETRIEVAL_ENABLED", "true").lower() == "true"
+    SPECULATIVE_REUSE_THRESHOLD = float(os.getenv("SPECULATIVE_REUSE_THRESHOLD", "0.9"))
+    SPECULATIVE_MAX_WORKERS = int(os.getenv("SPECULATIVE_MAX_WORKERS", "4"))
+    
+    # Multi-query expansion (1 = single rewrite, >1 = rewrite + sub-queries fused with RRF)
+    MULTI_QUERY_COUNT = int(os.getenv("MULTI_QUERY_COUNT", "1"))
+    
+    # Generation
+    GENERATION_TIMEOUT_S = float(os.getenv("GENERATION_TIMEOUT_S", "60"))
+    
+    # Per-stage context token budgets (0 disables packing).
+    # Keep budgets and formats equal across stages so the shared prompt prefix stays byte-identical.
+    CONTEXT_BUDGET_GENERATION = int(os.getenv("CONTEXT_BUDGET_GENERATION", "2000"))
+    CONTEXT_BUDGET_CRITIC = int(os.getenv("CONTEXT_BUDGET_CRITIC", "2000"))
+    CONTEXT_BUDGET_REVISION = int(os.getenv("CONTEXT_BUDGET_REVISION", "2000"))
+    
+    # Per-stage context format ("text" = "[source] text" blocks, "toon" = TOON tabular array)
+    CONTEXT_FORMAT_GENERATION = os.getenv("CONTEXT_FORMAT_GENERATION", "text")
+    CONTEXT_FORMAT_CRITIC = os.getenv("CONTEXT_FORMAT_CRITIC", "text")
+    CONTEXT_FORMAT_REVISION = os.getenv("CONTEXT_FORMAT_REVISION", "text")
+    
+    # Prompt layout: static instructions + context as a shared prefix across generation/critic/revision
+    PREFIX_CACHE_LAYOUT = os.getenv("PREFIX_CACHE_LAYOUT", "true").lower() == "true"
+    
+    # Critic loop: 'combined' (critique + revision in one LM call, falls back to 'separate') or 'separate'
+    CRITIC_LOOP_MODE = os.getenv("CRITIC_LOOP_MODE", "combined")
+    
+    # Critic memoization (LRU entries, 0 disables) and convergence stop between successive revisions
+    CRITIC_MEMO_SIZE = int(os.getenv("CRITIC_MEMO_SIZE", "1024"))
+    CRITIC_CONVERGENCE_THRESHOLD = float(os.getenv("CRITIC_CONVERGENCE_THRESHOLD", "0.98"))
+    
+    # Per-stage latency tracing; spans are appended to TRACE_FILE as JSONL (empty = keep in memory only)
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_FILE = os.getenv("TRACE_FILE", "data/traces.jsonl")
+    # Size at which TRACE_FILE is rotated to TRACE_FILE.1 (0 = never rotate)
+    TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(50 * 1024 * 1024)))
+    
+    # Pipeline executor: 'linear' (stages in sequence) or 'dag' (independent stages run concurrently)
+    PIPELINE_EXECUTOR = os.getenv("PIPELINE_EXECUTOR", "linear")
+    PIPELINE_DAG_MAX_WORKERS = int(os.getenv("PIPELINE_DAG_MAX_WORKERS", "4"))
+    PIPELINE_STAGE_TIMEOUTS = os.getenv("PIPELINE_STAGE_TIMEOUTS", "understand=10,retrieve=5,rank=10,answer=30")
+    # LM record/replay: '' (off), 'record' (live calls saved to the cassette) or 'replay' (offline);
+    # replay latency is 'recorded' or 'zero'
+    LM_CASSETTE_MODE = os.getenv("LM_CASSETTE_MODE", "")
+    LM_CASSETTE_PATH = os.getenv("LM_CASSETTE_PATH", "data/lm_cassette.jsonl")
+    LM_CASSETTE_LATENCY = os.getenv("LM_CASSETTE_LATENCY", "recorded")
+    # Warm the pipeline when it is created, optionally priming caches with the N most frequent past questions
+    WARMUP_ON_START = os.getenv("WARMUP_ON_START", "true").lower() == "true"
+    WARMUP_PRIME_QUESTIONS = int(os.getenv("WARMUP_PRIME_QUESTIONS", "0"))
+    # Default quality/latency mode: 'fast', 'balanced' or 'thorough' (overridable per request)
+    PIPELINE_MODE = os.getenv("PIPELINE_MODE", "thorough")
+    
+    # Max concurrent RAGPipeline.aforward requests per process
+    ASYNC_MAX_IN_FLIGHT = int(os.getenv("ASYNC_MAX_IN_FLIGHT", "32"))
+    
+    # RAGPipeline.batch: LM worker threads, LM calls per second (0 = unlimited), search queries per Milvus call
+    BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "8"))
+    BATCH_REQUESTS_PER_SECOND = float(os.getenv("BATCH_REQUESTS_PER_SECOND", "0"))
+    BATCH_SEARCH_CHUNK = int(os.getenv("BATCH_SEARCH_CHUNK", "256"))
+    
+    # Per-request budget (0 = unlimited); the critic loop stops early rather than exceed it
+    REQUEST_DEADLINE_S = float(os.getenv("REQUEST_DEADLINE_S", "30"))
+    REQUEST_MAX_TOKENS = int(os.getenv("REQUEST_MAX_TOKENS", "0"))
+    REQUEST_MAX_COST = float(os.getenv("REQUEST_MAX_COST", "0"))
+    # LM prices in USD per 1K tokens, used for cost budgets
+    LM_PROMPT_COST_PER_1K = float(os.getenv("LM_PROMPT_COST_PER_1K", "0.00015"))
+    LM_COMPLETION_COST_PER_1K = float(os.getenv("LM_COMPLETION_COST_PER_1K", "0.0006"))
+    # Deadline-driven degradation: skip the critic, LLM ranker, rewrite, then answer extractively
+    DEGRADATION_ENABLED = os.getenv("DEGRADATION_ENABLED", "true").lower() == "true"
+    # Stage latencies (s) assumed until measured
+    DEGRADATION_DEFAULT_ESTIMATES = os.getenv("DEGRADATION_DEFAULT_ESTIMATES", "understand=1.5,rank_llm=2.5,generate=4")
+    
+    # Generation strategy: 'critic_loop' (generate, then critique/revise serially) or 'best_of_n'
+    GENERATION_STRATEGY = os.getenv("GENERATION_STRATEGY", "critic_loop")
+    BEST_OF_N = int(os.getenv("BEST_OF_N", "3"))
+    BEST_OF_N_MAX_WORKERS = int(os.getenv("BEST_OF_N_MAX_WORKERS", "3"))
+    BEST_OF_N_MIN_TEMPERATURE = float(os.getenv("BEST_OF_N_MIN_TEMPERATURE", "0.3"))
+    BEST_OF_N_MAX_TEMPERATURE = float(os.getenv("BEST_OF_N_MAX_TEMPERATURE", "1.0"))
+    BEST_OF_N_REVISE_WINNER = os.getenv("BEST_OF_N_REVISE_WINNER", "true").lower() == "true"
+    
+    # Local grounding pre-check before the LLM critic loop
+    GROUNDING_ENABLED = os.getenv("GROUNDING_ENABLED", "true").lower() == "true"
+    GROUNDING_SENTENCE_THRESHOLD = float(os.getenv("GROUNDING_SENTENCE_THRESHOLD", "0.6"))
+    GROUNDING_SKIP_THRESHOLD = float(os.getenv("GROUNDING_SKIP_THRESHOLD", "0.8"))
+    GROUNDING_AUDIT_RATE = float(os.getenv("GROUNDING_AUDIT_RATE", "0.1"))
+    
     @staticmethod
     def validate():
         if not Config.OPENAI_API_KEY:
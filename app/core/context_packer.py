@@ -0,0 +1,104 @@
+import re
+import dspy
+from app.core.tokens import count_tokens, truncate_tokens
+from app.core.context_serializer import serialize_context
+from app.config import Config
+from typing import List, Optional
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+class ContextPacker:
+    """
+    Packs ranked passages into a per-stage token budget.
+    Passages are taken in ranked order (highest value first); the first passage that
+    doesn't fit is truncated on sentence boundaries (or cut at a token boundary when
+    not even one sentence fits) and everything after it is dropped. The top passage is
+    always kept, truncated if need be, so the context is never empty.
+    The packed passages are rendered in the stage's context format ('text' or 'toon').
+    """
+    SEPARATOR = "\n\n"
+
+    def __init__(self, budget_tokens: Optional[int], fmt: str = "text", min_truncated_tokens: int = 32):
+        # budget_tokens <= 0 or None disables packing
+        self.budget_tokens = budget_tokens if budget_tokens and budget_tokens > 0 else None
+        self.fmt = fmt
+        self.min_truncated_tokens = min_truncated_tokens
+
+    def pack(self, passages: List[str]) -> dspy.Prediction:
+        """
+        Returns the packed passages and the token counts used.
+        """
+        total_tokens = sum(count_tokens(p) for p in passages)
+        if self.budget_tokens is None or total_tokens <= self.budget_tokens:
+            return self._report(passages, total_tokens, total_tokens, truncated=False)
+
+        separator_tokens = count_tokens(self.SEPARATOR)
+        packed, used, truncated = [], 0, False
+        for passage in passages:
+            cost = count_tokens(passage) + (separator_tokens if packed else 0)
+            if used + cost <= self.budget_tokens:
+                packed.append(passage)
+                used += cost
+                continue
+
+            remaining = self.budget_tokens - used - (separator_tokens if packed else 0)
+            if remaining >= self.min_truncated_tokens or not packed:
+                partial = self._truncate(passage, max(remaining, 1))
+                if partial:
+                    packed.append(partial)
+                    used += count_tokens(partial) + (separator_tokens if len(packed) > 1 else 0)
+                    truncated = True
+            break
+
+        return self._report(packed, used, total_tokens, truncated=truncated, dropped=len(passages) - len(packed))
+
+    def join(self, passages: List[str]) -> str:
+        return serialize_context(passages, self.fmt)
+
+    @staticmethod
+    def _truncate(passage: str, max_tokens: int) -> str:
+        # Retrieved Passage objects are truncated on their text and rebuilt, so source/score survive
+        is_passage = hasattr(passage, "text") and hasattr(passage, "source")
+        text = passage.text if is_passage else passage
+        if is_passage:
+            max_tokens = max(max_tokens - count_tokens(f"[{passage.source}] "), 1)
+
+        kept, used = [], 0
+        for sentence in SENTENCE_BOUNDARY.split(text):
+            cost = count_tokens(sentence + " ")
+            if used + cost > max_tokens:
+                break
+            kept.append(sentence)
+            used += cost
+
+        # Not even the first sentence fits (or there are no sentence boundaries): cut at a token boundary
+        truncated = " ".join(kept) if kept else truncate_tokens(text, max_tokens)
+        if not truncated:
+            return ""
+        return type(passage)(truncated, passage.source, passage.score) if is_passage else truncated
+
+    def _report(self, passages: List[str], used: int, total: int, truncated: bool, dropped: int = 0) -> dspy.Prediction:
+        return dspy.Prediction(
+            passages=passages,
+            tokens_used=used,
+            tokens_available=total,
+            budget_tokens=self.budget_tokens,
+            truncated=truncated,
+            dropped=dropped
+        )
+
+def build_packer(stage: str) -> ContextPacker:
+    """
+    Creates the packer for a pipeline stage ('generation', 'critic' or 'revision').
+    """
+    budgets = {
+        "generation": Config.CONTEXT_BUDGET_GENERATION,
+        "critic": Config.CONTEXT_BUDGET_CRITIC,
+        "revision": Config.CONTEXT_BUDGET_REVISION,
+    }
+    formats = {
+        "generation": Config.CONTEXT_FORMAT_GENERATION,
+        "critic": Config.CONTEXT_FORMAT_CRITIC,
+        "revision": Config.CONTEXT_FORMAT_REVISION,
+    }
+    return ContextPacker(budgets[stage], fmt=formats[stage])
@@ -0,0 +1,40 @@
+import re
+from app.core.parsers.toon_parser import ToonParser
+from typing import List, Dict, Any, Optional
+
+CONTEXT_FORMATS = ("text", "toon")
+
+# Plain passages are rendered as "[source] text" by RetrieveEvidence
+PASSAGE_PATTERN = re.compile(r"^\[([^\]]*)\]\s*(.*)$", re.DOTALL)
+
+def similarity(distance: Optional[float]) -> Optional[float]:
+    """
+    Squared L2 distance to similarity; on normalized embeddings cos = 1 - d/2 (as in VectorScoreRanker).
+    """
+    return round(1.0 - distance / 2, 3) if distance is not None else None
+
+def passage_record(passage: str) -> Dict[str, Any]:
+    """
+    Splits a passage into its (source, score, text) fields.
+    Retrieved Passage objects keep their fields; plain strings are parsed from "[source] text".
+    The score is a similarity (higher is better), not the raw L2 distance Milvus returns.
+    """
+    if hasattr(passage, "source") and hasattr(passage, "text"):
+        return {"source": passage.source, "score": similarity(passage.score), "text": passage.text}
+
+    match = PASSAGE_PATTERN.match(passage)
+    if match:
+        return {"source": match.group(1), "score": None, "text": match.group(2)}
+    return {"source": "", "score": None, "text": passage}
+
+def serialize_context(passages: List[str], fmt: str = "text") -> str:
+    """
+    Renders passages for a prompt.
+    - text: the passages joined by blank lines (one "[source]" prefix per passage)
+    - toon: a TOON tabular array, declaring source/score/text once in the header
+    """
+    if fmt == "toon":
+        return ToonParser.dump({"passages": [passage_record(p) for p in passages]}) if passages else ""
+    if fmt == "text":
+        return "\n\n".join(passages)
+    raise ValueError(f"Unknown context format '{fmt}'. Choose from: {', '.join(CONTEXT_FORMATS)}")
@@ -1,5 +1,8 @@
+import re
 import dspy
-from typing import List
+from typing import Any, Dict, List, Optional
+from app.core.context_packer import build_packer
+from app.core.prompt_layout import shared_prefix_layout
 
 class CriticAgent(dspy.Module):
     """
@@ -7,8 +10,31 @@ class CriticAgent(dspy.Module):
     """
     def __init__(self):
         super().__init__()
-        self.prog = dspy.ChainOfThought("question, context, answer -> critique, score, passed")
+        self.packer = build_packer("critic")
+        self.prog = dspy.ChainOfThought("context, question, answer -> critique, score, passed")
 
-    def forward(self, question: str, context: List[str], answer: str):
-        context_str = "\n\n".join(context)
-        return self.prog(question=question, context=context_str, answer=answer)
+    def forward(self, question: str, context: List[str], answer: str, config: Optional[Dict[str, Any]] = None):
+        """
+        `config` overrides LM settings for this call (e.g. a request timeout).
+        """
+        packed = self.packer.pack(context)
+        # Context first (as a shared system prefix) so prefix caching can hit across stages
+        with shared_prefix_layout():
+            prediction = self.prog(context=self.packer.join(packed.passages), question=question, answer=answer, config=config or {})
+        prediction.context_tokens = packed.tokens_used
+        return prediction
+
+    async def aforward(self, question: str, context: List[str], answer: str, config: Optional[Dict[str, Any]] = None):
+        packed = self.packer.pack(context)
+        with shared_prefix_layout():
+            prediction = await self.prog.acall(context=self.packer.join(packed.passages), question=question, answer=answer,
+                                              config=config or {})
+        prediction.context_tokens = packed.tokens_used
+        return prediction
+
+def parse_score(raw_score) -> float:
+    """
+    Robust score parsing: the first number in the critic's score field, 0.0 if there is none.
+    """
+    score_match = re.search(r"(\d+(\.\d+)?)", str(raw_score))
+    return float(score_match.group(1)) if score_match else 0.0
@@ -0,0 +1,84 @@
+import re
+import dspy
+from typing import Any, Dict, List, Optional
+from app.core.context_packer import build_packer
+from app.core.prompt_layout import shared_prefix_layout
+from app.core.ranker import PARSE_ERRORS
+
+class CritiqueAndRevise(dspy.Signature):
+    """
+    Critique the answer for logical fallacies, contradictions and missing information
+    with respect to the context, score it, and decide whether it passes.
+    If it does not pass, rewrite it so that every issue in the critique is fixed;
+    if it passes, leave revised_answer empty.
+    """
+    context: str = dspy.InputField()
+    question: str = dspy.InputField()
+    answer: str = dspy.InputField()
+    critique: str = dspy.OutputField()
+    score: str = dspy.OutputField(desc="Quality score from 0 to 10")
+    passed: str = dspy.OutputField(desc="true or false")
+    revised_answer: str = dspy.OutputField(desc="Improved answer when passed is false, otherwise empty")
+
+class CritiqueReviseAgent(dspy.Module):
+    """
+    Critiques and, if needed, revises the answer in a single LM call, so each
+    critic-loop iteration sends the question and context once instead of twice.
+    Returns None when the output can't be used, so the caller can fall back to
+    the separate CriticAgent/RevisionAgent calls; provider errors and timeouts propagate.
+    """
+    def __init__(self):
+        super().__init__()
+        self.packer = build_packer("critic")
+        self.prog = dspy.ChainOfThought(CritiqueAndRevise)
+
+    def forward(self, question: str, context: List[str], answer: str, config: Optional[Dict[str, Any]] = None):
+        """
+        `config` overrides LM settings for this call (e.g. a request timeout).
+        """
+        packed = self.packer.pack(context)
+        try:
+            # Context first (as a shared system prefix) so prefix caching can hit across stages
+            with shared_prefix_layout():
+                prediction = self.prog(context=self.packer.join(packed.passages), question=question, answer=answer,
+                                       config=config or {})
+        except PARSE_ERRORS as e:
+            print(f"Combined critique could not be parsed ({e}).")
+            return None
+        return self._validate(prediction, packed.tokens_used)
+
+    async def aforward(self, question: str, context: List[str], answer: str, config: Optional[Dict[str, Any]] = None):
+        packed = self.packer.pack(context)
+        try:
+            with shared_prefix_layout():
+                prediction = await self.prog.acall(context=self.packer.join(packed.passages), question=question, answer=answer,
+                                                  config=config or {})
+        except PARSE_ERRORS as e:
+            print(f"Combined critique could not be parsed ({e}).")
+            return None
+        return self._validate(prediction, packed.tokens_used)
+
+    @staticmethod
+    def _validate(prediction: dspy.Prediction, context_tokens: int):
+        """
+        Normalizes the combined output, or returns None if it can't be used as-is.
+        """
+        score_match = re.search(r"(\d+(\.\d+)?)", str(prediction.score))
+        if not score_match or not str(prediction.critique or "").strip():
+            print("Combined critique is missing its score or critique.")
+            return None
+
+        score = float(score_match.group(1))
+        passed = score >= 9.0 or str(prediction.passed).strip().lower() == "true"
+        revised_answer = str(prediction.revised_answer or "").strip()
+        if not passed and not revised_answer:
+            print("Combined critique failed the answer without revising it.")
+            return None
+
+        return dspy.Prediction(
+            critique=prediction.critique,
+            score=score,
+            passed=passed,
+            revised_answer=revised_answer if not passed else None,
+            context_tokens=context_tokens
+        )
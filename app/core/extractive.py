@@ -0,0 +1,40 @@
+import re
+import dspy
+from typing import List
+from app.core.context_packer import SENTENCE_BOUNDARY
+from app.core.context_serializer import passage_record
+
+WORD_PATTERN = re.compile(r"\w+")
+
+class ExtractiveAnswer(dspy.Module):
+    """
+    Last-resort answer without any LM call: picks the sentences of the top passages
+    that share the most words with the question and cites their sources.
+    Has the same interface and output fields as AnswerGenerator.
+    """
+    def __init__(self, max_passages: int = 3, max_sentences: int = 3):
+        super().__init__()
+        self.max_passages = max_passages
+        self.max_sentences = max_sentences
+
+    def forward(self, context: List[str], question: str):
+        question_words = {w.lower() for w in WORD_PATTERN.findall(question) if len(w) > 2}
+
+        candidates = []
+        for rank, passage in enumerate(context[:self.max_passages]):
+            record = passage_record(passage)
+            for position, sentence in enumerate(SENTENCE_BOUNDARY.split(str(record["text"]).strip())):
+                if not sentence.strip():
+                    continue
+                overlap = len(question_words & {w.lower() for w in WORD_PATTERN.findall(sentence)})
+                # Prefer overlap, then higher-ranked passages, then earlier sentences
+                candidates.append((-overlap, rank, position, sentence.strip(), record["source"]))
+
+        chosen = sorted(sorted(candidates)[:self.max_sentences], key=lambda c: (c[1], c[2]))
+        if not chosen:
+            return dspy.Prediction(answer="No answer could be found in the retrieved context.",
+                                   confidence="0.0", sources=[], context_tokens=0)
+
+        sources = list(dict.fromkeys(c[4] for c in chosen if c[4]))
+        answer = " ".join(f"{c[3]} [{c[4]}]" if c[4] else c[3] for c in chosen)
+        return dspy.Prediction(answer=answer, confidence="0.3", sources=sources, context_tokens=0)
@@ -1,12 +1,21 @@
 import dspy
-from typing import List, Dict, Any
+import asyncio
+from typing import List, Dict, Any, Optional
 from app.core.parsers.toon_parser import ToonParser
+from app.core.context_packer import build_packer
+from app.core.prompt_layout import shared_prefix_layout
+from app.infrastructure.cassette import wrap_baml
+from app.config import Config
 try:
     from baml_client import b
+    from baml_client.async_client import b as async_b
     from baml_client.types import FinalAnswer
 except ImportError:
     b = None
+    async_b = None
     FinalAnswer = None
+# Record/replay BAML calls when LM_CASSETTE_MODE is set
+b, async_b = wrap_baml(b), wrap_baml(async_b)
 
 class AnswerGenerator(dspy.Module):
     """
@@ -16,6 +25,9 @@ class AnswerGenerator(dspy.Module):
     def __init__(self, output_format: str = "text"):
         super().__init__()
         self.output_format = output_format
+        self.packer = build_packer("generation")
+        # Built on first use of stream()
+        self._streaming_prog = None
         
         if self.output_format == "baml":
             if b is None:
@@ -48,38 +60,134 @@ class AnswerGenerator(dspy.Module):
         else:
             self.prog = dspy.ChainOfThought("context, question -> answer, confidence")
 
-    def forward(self, context: List[str], question: str):
-        # Join context list into a single string for valid input
-        context_str = "\n\n".join(context)
+    def forward(self, context: List[str], question: str, config: Optional[Dict[str, Any]] = None):
+        """
+        `config` overrides LM settings for this call (e.g. {"temperature": 0.9} for sampling
+        varied candidates); the BAML client takes its settings from the .baml files instead.
+        """
+        # Pack the context into the generation token budget and join it into a single string
+        packed = self.packer.pack(context)
+        context_str = self.packer.join(packed.passages)
         
         if self.output_format == "baml":
             # Call BAML generated function
-            # Note: synchronous call for now
+            # Note: synchronous call; aforward uses BamlAsyncClient
+            # BAML bypasses the DSPy LM, so take a slot from a rate-limited LM (see RateLimitedLM) first
+            acquire = getattr(dspy.settings.lm, "acquire", None)
+            if acquire:
+                acquire()
             response: FinalAnswer = b.GenerateAnswer(question=question, context=context_str)
-            
-            # Map BAML typed output to dspy.Prediction
-            return dspy.Prediction(
-                answer=response.answer,
-                confidence=str(response.confidence), # Format string for consistency
-                sources=[s.name for s in response.sources],
-                raw_baml=response
-            )
-
-        if self.output_format == "toon":
+            prediction = self._from_baml(response)
+        elif self.output_format == "toon":
             # Prompt engineering to encourage TOON
-            dsp_prediction = self.prog(
-                context=context_str, 
-                question=question
-            )
-            # Parse TOON
-            parsed = ToonParser.parse(dsp_prediction.answer_toon)
-            
-            # Map back to standard prediction fields
-            return dspy.Prediction(
-                answer=parsed.get("answer", dsp_prediction.answer_toon),
-                confidence=parsed.get("confidence", "0.0"),
-                sources=parsed.get("sources", []),
-                raw_toon=dsp_prediction.answer_toon
-            )
+            with shared_prefix_layout():
+                dsp_prediction = self.prog(
+                    context=context_str, 
+                    question=question,
+                    config=config or {}
+                )
+            prediction = self._from_toon(dsp_prediction)
         else:
-            return self.prog(context=context_str, question=question)
+            with shared_prefix_layout():
+                prediction = self.prog(context=context_str, question=question, config=config or {})
+
+        prediction.context_tokens = packed.tokens_used
+        return prediction
+
+    async def aforward(self, context: List[str], question: str, timeout: Optional[float] = Config.GENERATION_TIMEOUT_S,
+                       config: Optional[Dict[str, Any]] = None):
+        """
+        Async variant of forward (call via `await generator.acall(...)`).
+        BAML goes through BamlAsyncClient, so concurrent generations don't each hold a thread.
+        Raises TimeoutError after `timeout` seconds; cancelling the awaiting task cancels the call.
+        """
+        packed = self.packer.pack(context)
+        context_str = self.packer.join(packed.passages)
+
+        try:
+            if self.output_format == "baml":
+                response: FinalAnswer = await asyncio.wait_for(
+                    async_b.GenerateAnswer(question=question, context=context_str), timeout=timeout
+                )
+                prediction = self._from_baml(response)
+            else:
+                with shared_prefix_layout():
+                    dsp_prediction = await asyncio.wait_for(
+                        self.prog.acall(context=context_str, question=question, config=config or {}), timeout=timeout
+                    )
+                prediction = self._from_toon(dsp_prediction) if self.output_format == "toon" else dsp_prediction
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Answer generation ({self.output_format}) timed out after {timeout}s")
+
+        prediction.context_tokens = packed.tokens_used
+        return prediction
+
+    def stream(self, context: List[str], question: str, config: Optional[Dict[str, Any]] = None):
+        """
+        Streaming variant of forward.
+        Yields the partial answer text (cumulative) as tokens arrive, then the same
+        dspy.Prediction that forward would return.
+        """
+        packed = self.packer.pack(context)
+        context_str = self.packer.join(packed.passages)
+
+        if self.output_format == "baml":
+            # BAML streams partially-parsed FinalAnswer objects (see baml_client/stream_types.py)
+            stream = b.stream.GenerateAnswer(question=question, context=context_str)
+            for partial in stream:
+                if partial.answer:
+                    yield partial.answer
+            prediction = self._from_baml(stream.get_final_response())
+            prediction.context_tokens = packed.tokens_used
+            yield prediction
+            return
+
+        field_name = "answer_toon" if self.output_format == "toon" else "answer"
+        if self._streaming_prog is None:
+            self._streaming_prog = dspy.streamify(
+                self.prog,
+                stream_listeners=[dspy.streaming.StreamListener(signature_field_name=field_name)],
+                async_streaming=False
+            )
+
+        buffer = ""
+        # The program runs lazily while we iterate, so the layout must wrap the whole loop
+        with shared_prefix_layout():
+            for chunk in self._streaming_prog(context=context_str, question=question, config=config or {}):
+                if isinstance(chunk, dspy.streaming.StreamResponse):
+                    buffer += chunk.chunk
+                    if self.output_format == "toon":
+                        # Show only the 'answer' key of the TOON document while it is being written
+                        partial = ToonParser.parse(buffer).get("answer")
+                        if partial:
+                            yield partial
+                    else:
+                        yield buffer
+                elif isinstance(chunk, dspy.Prediction):
+                    # The final prediction always arrives last (and alone for cached LM responses)
+                    prediction = self._from_toon(chunk) if self.output_format == "toon" else chunk
+                    prediction.context_tokens = packed.tokens_used
+                    yield prediction
+
+    @staticmethod
+    def _from_baml(response: "FinalAnswer") -> dspy.Prediction:
+        # Map BAML typed output to dspy.Prediction
+        return dspy.Prediction(
+            answer=response.answer,
+            confidence=str(response.confidence), # Format string for consistency
+            sources=[s.name for s in response.sources],
+            raw_baml=response
+        )
+
+    @staticmethod
+    def _from_toon(dsp_prediction: dspy.Prediction) -> dspy.Prediction:
+        # Parse TOON
+        parsed = ToonParser.parse(dsp_prediction.answer_toon)
+        
+        # Map back to standard prediction fields
+        return dspy.Prediction(
+            answer=parsed.get("answer", dsp_prediction.answer_toon),
+            confidence=parsed.get("confidence", "0.0"),
+            sources=parsed.get("sources", []),
+            raw_toon=dsp_prediction.answer_toon
+        )
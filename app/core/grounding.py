@@ -0,0 +1,94 @@
+import re
+import random
+import threading
+import dspy
+import numpy as np
+from app.core.context_packer import SENTENCE_BOUNDARY
+from app.core.context_serializer import passage_record
+from app.config import Config
+from typing import List
+
+CITATION_PATTERN = re.compile(r"\[([^\]]+)\]")
+
+class GroundingScorer:
+    """
+    Local, CPU-only grounding check run before the LLM critic.
+    Each answer sentence is matched to its most similar passage (embedding cosine);
+    the score combines the share of supported sentences, the mean best-match similarity
+    and the precision of any [source] citations in the answer.
+    """
+    def __init__(self, embedding_model, sentence_threshold: float = Config.GROUNDING_SENTENCE_THRESHOLD,
+                 skip_threshold: float = Config.GROUNDING_SKIP_THRESHOLD, audit_rate: float = Config.GROUNDING_AUDIT_RATE):
+        self.embedding_model = embedding_model
+        self.sentence_threshold = sentence_threshold
+        self.skip_threshold = skip_threshold
+        self.audit_rate = audit_rate
+        self._lock = threading.Lock() # Shared by concurrent critic loops
+        self.stats = {"checks": 0, "skipped": 0, "compared": 0, "agreed": 0}
+
+    def score(self, answer: str, context: List[str]) -> dspy.Prediction:
+        records = [passage_record(p) for p in context]
+        sentences = [s for s in SENTENCE_BOUNDARY.split(str(answer).strip()) if s.strip()]
+        with self._lock:
+            self.stats["checks"] += 1
+
+        if not sentences or not records:
+            return dspy.Prediction(score=0.0, support=0.0, mean_similarity=0.0, citation_precision=None, confident=False)
+
+        # One batched encode for sentences and passages
+        vectors = np.asarray(self.embedding_model.encode(sentences + [r["text"] for r in records]), dtype=np.float32)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        sentence_vecs, passage_vecs = vectors[:len(sentences)], vectors[len(sentences):]
+
+        best_match = (sentence_vecs @ passage_vecs.T).max(axis=1)
+        support = float((best_match >= self.sentence_threshold).mean())
+        mean_similarity = float(best_match.mean())
+        score = 0.6 * support + 0.4 * mean_similarity
+
+        # Citations to sources that aren't in the context are a strong hallucination signal
+        cited = {c.strip().lower() for c in CITATION_PATTERN.findall(str(answer))}
+        citation_precision = None
+        if cited:
+            known = {str(r["source"]).lower() for r in records}
+            citation_precision = len(cited & known) / len(cited)
+            score *= citation_precision
+
+        return dspy.Prediction(
+            score=score,
+            support=support,
+            mean_similarity=mean_similarity,
+            citation_precision=citation_precision,
+            confident=score >= self.skip_threshold
+        )
+
+    def should_skip(self, check: dspy.Prediction) -> bool:
+        """
+        Skips the LLM critic for confident answers, except for a sampled share that is
+        still audited by the critic so agreement can be measured.
+        """
+        if not check.confident or random.random() < self.audit_rate:
+            return False
+        with self._lock:
+            self.stats["skipped"] += 1
+        return True
+
+    def record_agreement(self, check: dspy.Prediction, critic_passed: bool):
+        with self._lock:
+            self.stats["compared"] += 1
+            self.stats["agreed"] += int(check.confident == critic_passed)
+            compared, agreement_rate = self.stats["compared"], self._agreement_rate()
+        print(f"Grounding pre-check: agreement with LLM critic {agreement_rate:.0%} "
+              f"over {compared} comparisons")
+
+    @property
+    def skip_rate(self) -> float:
+        with self._lock:
+            return self.stats["skipped"] / self.stats["checks"] if self.stats["checks"] else 0.0
+
+    @property
+    def agreement_rate(self) -> float:
+        with self._lock:
+            return self._agreement_rate()
+
+    def _agreement_rate(self) -> float:
+        return self.stats["agreed"] / self.stats["compared"] if self.stats["compared"] else 0.0
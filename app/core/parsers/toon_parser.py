@@ -1,5 +1,6 @@
 import re
-from typing import Dict, Any, Optional
+import json
+from typing import Dict, Any, Optional, List
 
 class ToonParser:
     """
@@ -14,6 +15,7 @@ class ToonParser:
         Supports:
         - key: value
         - key[n]: val1, val2
+        - key[n]{field1,field2}: followed by n indented rows (tabular array)
         """
         try:
             # Clean up
@@ -27,10 +29,26 @@ class ToonParser:
             
             # Simple line-based parser
             lines = cleaned.split('\n')
+            table_key, table_fields, table_rows_left = None, [], 0
             for line in lines:
                 line = line.strip()
                 if not line: continue
                 
+                # Rows of the current tabular array
+                if table_rows_left > 0:
+                    data[table_key].append(dict(zip(table_fields, ToonParser._split_row(line))))
+                    table_rows_left -= 1
+                    continue
+                
+                # Match "key[n]{f1,f2}:" (Tabular array header)
+                table_match = re.match(r"^(\w+)\[(\d+)\]\{([^}]*)\}:$", line)
+                if table_match:
+                    table_key, count, fields_str = table_match.groups()
+                    table_fields = [f.strip() for f in fields_str.split(',')]
+                    table_rows_left = int(count)
+                    data[table_key] = []
+                    continue
+                
                 # Match "key[n]: val1, val2" (Array)
                 array_match = re.match(r"^(\w+)\[(\d+)\]:\s*(.*)$", line)
                 if array_match:
@@ -63,8 +81,54 @@ class ToonParser:
         # Simple dumper
         lines = []
         for k, v in data.items():
-            if isinstance(v, list):
+            if isinstance(v, list) and v and all(isinstance(item, dict) for item in v):
+                # Tabular array: field names are declared once in the header, rows carry only values
+                fields = list(v[0].keys())
+                lines.append(f"{k}[{len(v)}]{{{','.join(fields)}}}:")
+                for item in v:
+                    lines.append("  " + ",".join(ToonParser._quote(item.get(f)) for f in fields))
+            elif isinstance(v, list):
                 lines.append(f"{k}[{len(v)}]: {','.join(map(str, v))}")
             else:
                 lines.append(f"{k}: {v}")
         return "\n".join(lines)
+
+    @staticmethod
+    def _quote(value: Any) -> str:
+        """
+        Renders a tabular cell, quoting only when the value would be ambiguous unquoted.
+        """
+        if value is None:
+            return ""
+        if isinstance(value, float):
+            return f"{value:.3g}"
+        text = str(value)
+        if text == "" or text != text.strip() or any(c in text for c in ',"\n\\'):
+            return json.dumps(text, ensure_ascii=False)
+        return text
+
+    @staticmethod
+    def _split_row(line: str) -> List[str]:
+        """
+        Splits a tabular row on commas outside of double-quoted cells.
+        """
+        cells, current, in_quotes, escaped = [], "", False, False
+        for ch in line:
+            if in_quotes:
+                current += ch
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == '"':
+                    in_quotes = False
+            elif ch == '"':
+                in_quotes = True
+                current += ch
+            elif ch == ",":
+                cells.append(current)
+                current = ""
+            else:
+                current += ch
+        cells.append(current)
+        return [json.loads(c.strip()) if c.strip().startswith('"') else c.strip() for c in cells]
@@ -0,0 +1,49 @@
+import dspy
+from contextlib import nullcontext
+from app.config import Config
+
+SHARED_PREFIX_INSTRUCTIONS = (
+    "You are one step of a retrieval-augmented question answering pipeline "
+    "(answer generation, critique or revision). The reference context for this request "
+    "is given below and is the only evidence you may rely on. Your specific task and "
+    "its input/output format follow in the next message."
+)
+
+def shared_prefix(context: str) -> str:
+    """
+    The leading system message shared by every stage of a request.
+    """
+    return f"{SHARED_PREFIX_INSTRUCTIONS}\n\n[[ ## context ## ]]\n{context}"
+
+class SharedContextAdapter(dspy.ChatAdapter):
+    """
+    Lays prompts out so provider-side prefix caching can hit across stages.
+    The shared `context` input is moved out of the per-signature prompt into a leading
+    system message (static instructions + context) that is byte-identical for the
+    generation, critic and revision calls of a request. Everything stage-specific
+    (signature instructions, question, answer, critique) follows it.
+    """
+    def __init__(self, shared_field: str = "context", **kwargs):
+        super().__init__(**kwargs)
+        self.shared_field = shared_field
+
+    def format(self, signature, demos, inputs):
+        # Compiled programs with demos keep the default layout so demo contexts aren't lost
+        if self.shared_field not in signature.input_fields or demos:
+            return super().format(signature, demos, inputs)
+
+        inputs = dict(inputs)
+        shared_value = inputs.pop(self.shared_field)
+        messages = super().format(signature.delete(self.shared_field), demos, inputs)
+        return [{"role": "system", "content": shared_prefix(shared_value)}] + messages
+
+_adapter = SharedContextAdapter()
+
+def shared_prefix_layout():
+    """
+    Context manager applying the shared-prefix layout to the DSPy calls inside it
+    (a no-op when PREFIX_CACHE_LAYOUT is disabled).
+    """
+    if not Config.PREFIX_CACHE_LAYOUT:
+        return nullcontext()
+    return dspy.context(adapter=_adapter)
@@ -0,0 +1,124 @@
+import re
+import threading
+import numpy as np
+from app.config import Config
+from typing import Dict, List, Optional
+
+# Reference queries for the embedding check. Simple ones can go straight to retrieval,
+# complex ones benefit from the LLM rewrite in QueryUnderstanding.
+SIMPLE_QUERY_EXAMPLES = [
+    "milvus index types",
+    "what is dspy",
+    "BAML output format",
+    "define retrieval augmented generation",
+    "sentence transformers embedding dimension",
+    "TOON syntax",
+]
+
+COMPLEX_QUERY_EXAMPLES = [
+    "How does DSPy compare to prompt engineering for building RAG systems?",
+    "Why would the critic loop reject an answer that cites the right source?",
+    "What changed between the first and second version and how does it affect retrieval?",
+    "Can you explain it in simpler terms?",
+    "Which is better for structured output, TOON or BAML, and why?",
+]
+
+# Signals that a query needs interpretation (comparisons, reasoning, references to earlier turns)
+COMPLEX_MARKERS = re.compile(
+    r"\b(why|how|compare|compared|comparison|difference|differences|versus|vs|between|"
+    r"explain|should|better|worse|pros|cons|it|this|that|they|them|those|these)\b",
+    re.IGNORECASE,
+)
+
+class QueryRouter:
+    """
+    Cheap local classifier deciding whether a raw query can skip QueryUnderstanding
+    and go straight to retrieval. Uses word-count/keyword heuristics, optionally
+    confirmed by embedding similarity against example queries.
+    """
+    def __init__(self, embedding_model=None, max_words: int = Config.FASTPATH_MAX_WORDS,
+                 similarity_margin: float = Config.FASTPATH_SIMILARITY_MARGIN):
+        self.embedding_model = embedding_model
+        self.max_words = max_words
+        self.similarity_margin = similarity_margin
+        self._simple_vectors = None
+        self._complex_vectors = None
+
+        # Running totals (the router is shared by concurrent requests), so memory and the
+        # per-request averages stay constant however many queries have been served
+        self._lock = threading.Lock()
+        self.stats = {"total": 0, "bypassed": 0}
+        self.score_sums = {"bypassed": 0.0, "rewritten": 0.0}
+        self.score_counts = {"bypassed": 0, "rewritten": 0}
+
+    def should_bypass(self, user_query: str) -> bool:
+        bypass = self._is_simple(user_query)
+        with self._lock:
+            self.stats["total"] += 1
+            if bypass:
+                self.stats["bypassed"] += 1
+            total, rate = self.stats["total"], self._rate()
+
+        print(f"Query router: {'fast path' if bypass else 'rewrite'} | "
+              f"bypass rate {rate:.0%} of {total} queries")
+        return bypass
+
+    def record_outcome(self, bypassed: bool, final_score: float):
+        """
+        Tracks the downstream critic score per route so bypass quality can be compared.
+        """
+        route = "bypassed" if bypassed else "rewritten"
+        with self._lock:
+            self.score_sums[route] += final_score
+            self.score_counts[route] += 1
+            means = self._mean_scores()
+        print(f"Query router quality: bypassed avg {self._fmt(means['bypassed'])}, "
+              f"rewritten avg {self._fmt(means['rewritten'])}")
+
+    def _mean_scores(self) -> Dict[str, Optional[float]]:
+        return {route: (self.score_sums[route] / count if count else None)
+                for route, count in self.score_counts.items()}
+
+    @property
+    def bypass_rate(self) -> float:
+        with self._lock:
+            return self._rate()
+
+    def _rate(self) -> float:
+        return self.stats["bypassed"] / self.stats["total"] if self.stats["total"] else 0.0
+
+    def _is_simple(self, user_query: str) -> bool:
+        words = user_query.split()
+        if not words or len(words) > self.max_words:
+            return False
+        if COMPLEX_MARKERS.search(user_query):
+            return False
+        if self.embedding_model is None:
+            return True
+
+        # Heuristics say simple; confirm it looks more like the simple examples
+        query_vec = self._normalize(self.embedding_model.encode(user_query))[0]
+        simple_sim = float(np.max(self.simple_vectors @ query_vec))
+        complex_sim = float(np.max(self.complex_vectors @ query_vec))
+        return simple_sim - complex_sim >= self.similarity_margin
+
+    @property
+    def simple_vectors(self) -> np.ndarray:
+        if self._simple_vectors is None:
+            self._simple_vectors = self._normalize(self.embedding_model.encode(SIMPLE_QUERY_EXAMPLES))
+        return self._simple_vectors
+
+    @property
+    def complex_vectors(self) -> np.ndarray:
+        if self._complex_vectors is None:
+            self._complex_vectors = self._normalize(self.embedding_model.encode(COMPLEX_QUERY_EXAMPLES))
+        return self._complex_vectors
+
+    @staticmethod
+    def _normalize(vectors: List[List[float]]) -> np.ndarray:
+        arr = np.asarray(vectors, dtype=np.float32)
+        return arr / np.clip(np.linalg.norm(arr, axis=1, keepdims=True), 1e-12, None)
+
+    @staticmethod
+    def _fmt(value: Optional[float]) -> str:
+        return f"{value:.1f}/10" if value is not None else "n/a"
@@ -1,12 +1,49 @@
 import dspy
+from typing import Any, Dict, List, Optional
+from app.config import Config
 
 class QueryUnderstanding(dspy.Module):
     """
     Interprets user queries to extract intent, entities, and rewrite for better retrieval.
+    With num_queries > 1 it also proposes sub-queries/paraphrases for fan-out retrieval.
     """
-    def __init__(self):
+    def __init__(self, num_queries: int = Config.MULTI_QUERY_COUNT):
         super().__init__()
-        self.prog = dspy.ChainOfThought("user_query -> search_query, intent, entities")
+        self.num_queries = num_queries
 
-    def forward(self, user_query: str):
-        return self.prog(user_query=user_query)
+        if self.num_queries > 1:
+            class ExpandQuery(dspy.Signature):
+                """
+                Rewrite the user query for semantic search, and propose alternative sub-queries
+                or paraphrases that together cover everything the user is asking for.
+                """
+                user_query: str = dspy.InputField()
+                search_query: str = dspy.OutputField()
+                intent: str = dspy.OutputField()
+                entities: str = dspy.OutputField()
+                sub_queries: List[str] = dspy.OutputField(
+                    desc=f"Up to {num_queries - 1} short search queries that differ from search_query"
+                )
+
+            self.prog = dspy.ChainOfThought(ExpandQuery)
+        else:
+            self.prog = dspy.ChainOfThought("user_query -> search_query, intent, entities")
+
+    def forward(self, user_query: str, config: Optional[Dict[str, Any]] = None):
+        """
+        `config` overrides LM settings for this call (e.g. a request timeout).
+        """
+        return self._with_search_queries(self.prog(user_query=user_query, config=config or {}))
+
+    async def aforward(self, user_query: str, config: Optional[Dict[str, Any]] = None):
+        return self._with_search_queries(await self.prog.acall(user_query=user_query, config=config or {}))
+
+    def _with_search_queries(self, prediction: dspy.Prediction) -> dspy.Prediction:
+        search_queries = [prediction.search_query]
+        for sub_query in (prediction.get("sub_queries") or []):
+            sub_query = str(sub_query).strip()
+            if sub_query and sub_query.lower() not in {q.lower() for q in search_queries}:
+                search_queries.append(sub_query)
+
+        prediction.search_queries = search_queries[:max(1, self.num_queries)]
+        return prediction
@@ -1,23 +1,206 @@
 import dspy
-from typing import List
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from app.config import Config
+try:
+    from dspy.utils.exceptions import AdapterParseError
+except ImportError:
+    # Older DSPy versions raise ValueError for unparseable LM output
+    AdapterParseError = ValueError
+
+# Malformed ranker output; provider errors (auth, rate limits, network, timeouts) propagate
+PARSE_ERRORS = (AdapterParseError, ValueError, TypeError)
+
+class RankEvidence(dspy.Signature):
+    """
+    Rank the numbered passages by how useful they are for answering the question.
+    Return only the indices of relevant passages, most relevant first, together with
+    a relevance score between 0 and 1 for each returned index.
+    """
+    question: str = dspy.InputField()
+    contexts: str = dspy.InputField(desc="Passages, each prefixed with its index as [i]")
+    ranked_indices: List[int] = dspy.OutputField(desc="Indices of the relevant passages, most relevant first")
+    scores: List[float] = dspy.OutputField(desc="Relevance score (0-1) for each index in ranked_indices, same order")
 
 class EvidenceRanker(dspy.Module):
     """
     Ranks and filters retrieved evidence to select the most relevant chunks.
+    The LM only returns passage indices and scores; the selected passages are
+    forwarded verbatim instead of the LM's paraphrase of them.
     """
-    def __init__(self):
+    def __init__(self, top_n: int = Config.RERANKER_TOP_N):
         super().__init__()
-        self.prog = dspy.ChainOfThought("question, contexts -> ranked_contexts")
+        self.top_n = top_n
+        self.prog = dspy.ChainOfThought(RankEvidence)
+
+    def forward(self, question: str, contexts: List[str], config: Optional[Dict[str, Any]] = None):
+        """
+        `config` overrides LM settings for this call (e.g. a request timeout).
+        """
+        if not contexts:
+            return dspy.Prediction(ranked_contexts=[], ranked_indices=[], scores=[])
 
-    def forward(self, question: str, contexts: List[str]):
         # Join contexts with indices for the LM to reference
         context_str = "\n".join([f"[{i}] {ctx}" for i, ctx in enumerate(contexts)])
-        
-        # The LM should output the list of selected/ranked evidence
-        prediction = self.prog(question=question, contexts=context_str)
-        
-        # In a real scenario, we'd parse the output to select specific indices.
-        # For this v1, we'll trust the LM's generated 'ranked_contexts' or just pass through if it's text.
-        # Ideally, we want it to return a list of best chunks.
-        
-        return prediction
+
+        try:
+            prediction = self.prog(question=question, contexts=context_str, config=config or {})
+            indices, scores = self._validate(prediction.ranked_indices, prediction.scores, len(contexts))
+        except PARSE_ERRORS as e:
+            print(f"Ranker output could not be parsed ({e}). Keeping retrieval order.")
+            indices, scores = [], []
+
+        return self._select(contexts, indices, scores)
+
+    async def aforward(self, question: str, contexts: List[str], config: Optional[Dict[str, Any]] = None):
+        if not contexts:
+            return dspy.Prediction(ranked_contexts=[], ranked_indices=[], scores=[])
+
+        context_str = "\n".join([f"[{i}] {ctx}" for i, ctx in enumerate(contexts)])
+
+        try:
+            prediction = await self.prog.acall(question=question, contexts=context_str, config=config or {})
+            indices, scores = self._validate(prediction.ranked_indices, prediction.scores, len(contexts))
+        except PARSE_ERRORS as e:
+            print(f"Ranker output could not be parsed ({e}). Keeping retrieval order.")
+            indices, scores = [], []
+
+        return self._select(contexts, indices, scores)
+
+    def _select(self, contexts: List[str], indices: List[int], scores: List[float]) -> dspy.Prediction:
+        if not indices:
+            # Fall back to the vector search order
+            indices, scores = list(range(len(contexts))), [0.0] * len(contexts)
+
+        indices, scores = indices[:self.top_n], scores[:self.top_n]
+
+        return dspy.Prediction(
+            ranked_contexts=[contexts[i] for i in indices],
+            ranked_indices=indices,
+            scores=scores
+        )
+
+    @staticmethod
+    def _validate(raw_indices, raw_scores, num_contexts: int):
+        """
+        Drops out-of-range and duplicate indices, keeping each index aligned with its score.
+        """
+        raw_indices = list(raw_indices or [])
+        raw_scores = list(raw_scores or [])
+
+        indices, scores = [], []
+        for pos, raw_idx in enumerate(raw_indices):
+            try:
+                idx = int(raw_idx)
+            except (TypeError, ValueError):
+                continue
+            if idx < 0 or idx >= num_contexts or idx in indices:
+                continue
+
+            try:
+                score = float(raw_scores[pos])
+            except (IndexError, TypeError, ValueError):
+                score = 0.0
+
+            indices.append(idx)
+            scores.append(score)
+
+        return indices, scores
+
+class CrossEncoderRanker(dspy.Module):
+    """
+    Ranks evidence locally with a CPU cross-encoder instead of an LM round trip.
+    (question, passage) pairs are scored in batches on a small thread pool, then
+    filtered by a score cutoff and truncated to the top-n passages.
+    """
+    def __init__(
+        self,
+        top_n: int = Config.RERANKER_TOP_N,
+        score_cutoff: Optional[float] = Config.RERANKER_SCORE_CUTOFF,
+        batch_size: int = Config.RERANKER_BATCH_SIZE,
+        max_workers: int = Config.RERANKER_MAX_WORKERS,
+    ):
+        super().__init__()
+        self.top_n = top_n
+        self.score_cutoff = score_cutoff
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        # Loaded lazily so the model is only paid for when this backend is actually used
+        self._model = None
+        self._executor = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            from app.infrastructure.cross_encoder import CrossEncoderModel
+            self._model = CrossEncoderModel()
+        return self._model
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="reranker")
+        return self._executor
+
+    def forward(self, question: str, contexts: List[str]):
+        if not contexts:
+            return dspy.Prediction(ranked_contexts=[], ranked_indices=[], scores=[])
+
+        pairs = [(question, ctx) for ctx in contexts]
+        batches = [pairs[i:i + self.batch_size] for i in range(0, len(pairs), self.batch_size)]
+
+        # executor.map preserves batch order, so scores line up with contexts
+        scores = [s for batch_scores in self.executor.map(self.model.score, batches) for s in batch_scores]
+
+        order = sorted(range(len(contexts)), key=lambda i: scores[i], reverse=True)
+        if self.score_cutoff is not None:
+            # Never drop everything: the best passage is kept even below the cutoff
+            order = [i for i in order if scores[i] >= self.score_cutoff] or order[:1]
+        order = order[:self.top_n]
+
+        return dspy.Prediction(
+            ranked_contexts=[contexts[i] for i in order],
+            ranked_indices=order,
+            scores=[scores[i] for i in order]
+        )
+
+    async def aforward(self, question: str, contexts: List[str]):
+        # CPU-bound scoring: keep it off the event loop
+        return await asyncio.to_thread(self.forward, question, contexts)
+
+class VectorScoreRanker(dspy.Module):
+    """
+    Keeps the vector search order and truncates to the top-n passages. No model is called.
+    """
+    def __init__(self, top_n: int = Config.RERANKER_TOP_N):
+        super().__init__()
+        self.top_n = top_n
+
+    def forward(self, question: str, contexts: List[str], distances: Optional[List[float]] = None):
+        indices = list(range(min(self.top_n, len(contexts))))
+        # Milvus returns squared L2 distances; on normalized embeddings cos = 1 - d/2
+        scores = [1.0 - distances[i] / 2 for i in indices] if distances else [0.0] * len(indices)
+        return dspy.Prediction(
+            ranked_contexts=[contexts[i] for i in indices],
+            ranked_indices=indices,
+            scores=scores
+        )
+
+    async def aforward(self, question: str, contexts: List[str], distances: Optional[List[float]] = None):
+        return self.forward(question, contexts, distances)
+
+# Registry of selectable ranking backends (see Config.RERANKER_BACKEND)
+RANKER_BACKENDS = {
+    "llm": EvidenceRanker,
+    "cross_encoder": CrossEncoderRanker,
+    "vector": VectorScoreRanker,
+}
+
+def build_ranker(backend: str = Config.RERANKER_BACKEND) -> dspy.Module:
+    """
+    Instantiates the ranking module for the configured backend.
+    """
+    if backend not in RANKER_BACKENDS:
+        raise ValueError(f"Unknown reranker backend '{backend}'. Choose from: {', '.join(RANKER_BACKENDS)}")
+    return RANKER_BACKENDS[backend]()
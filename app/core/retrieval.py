@@ -1,6 +1,41 @@
 import dspy
+import asyncio
 from app.infrastructure.milvus_client import MilvusClient
-from typing import List, Dict
+from app.infrastructure import tracing
+from typing import List, Dict, Optional
+
+class Passage(str):
+    """
+    A retrieved passage. Behaves as its "[source] text" rendering everywhere a string
+    is expected, but keeps the underlying fields so prompt serializers can lay the
+    passages out differently (e.g. as a TOON table).
+    """
+    def __new__(cls, text: str, source: str, score: Optional[float] = None):
+        passage = super().__new__(cls, f"[{source}] {text}")
+        passage.text = text
+        passage.source = source
+        passage.score = score
+        return passage
+
+    def __getnewargs__(self):
+        # Keeps pickling/deepcopy working with the extra constructor arguments
+        return (self.text, self.source, self.score)
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict]], k: int = 60) -> List[Dict]:
+    """
+    Fuses several ranked hit lists with reciprocal-rank fusion, deduplicating by entity id.
+    Each fused hit keeps the best (lowest) L2 distance seen for that id as its 'score'.
+    """
+    fused_scores: Dict = {}
+    best_hits: Dict = {}
+    for results in result_lists:
+        for rank, hit in enumerate(results):
+            fused_scores[hit["id"]] = fused_scores.get(hit["id"], 0.0) + 1.0 / (k + rank + 1)
+            if hit["id"] not in best_hits or hit["score"] < best_hits[hit["id"]]["score"]:
+                best_hits[hit["id"]] = hit
+
+    ranked_ids = sorted(fused_scores, key=lambda hit_id: fused_scores[hit_id], reverse=True)
+    return [best_hits[hit_id] for hit_id in ranked_ids]
 
 class RetrieveEvidence(dspy.Module):
     """
@@ -15,11 +50,57 @@ class RetrieveEvidence(dspy.Module):
         """
         Returns a dspy.Prediction containing a list of 'passages' (dicts with text/source).
         """
-        results = self.milvus_client.search(search_query, top_k=self.k)
-        
+        with tracing.span("encode", texts=1):
+            query_vector = self.milvus_client.embedding_model.encode(search_query)[0]
+        return self.search_vector(query_vector)
+
+    def search_vector(self, query_vector: List[float]) -> dspy.Prediction:
+        """
+        Retrieves with a pre-computed query embedding (e.g. one already encoded for routing).
+        """
+        results = self.milvus_client.search_vectors([query_vector], top_k=self.k)[0]
+        return self.to_prediction(results, query_vector=query_vector)
+
+    async def aforward(self, search_query: str) -> dspy.Prediction:
+        """
+        Async variant of forward: the CPU encode and the Milvus search run off the event loop.
+        """
+        with tracing.span("encode", texts=1):
+            query_vector = (await asyncio.to_thread(self.milvus_client.embedding_model.encode, search_query))[0]
+        return await self.asearch_vector(query_vector)
+
+    async def asearch_vector(self, query_vector: List[float]) -> dspy.Prediction:
+        results = (await self.milvus_client.asearch_vectors([query_vector], top_k=self.k))[0]
+        return self.to_prediction(results, query_vector=query_vector)
+
+    def search_many(self, search_queries: List[str]) -> List[dspy.Prediction]:
+        """
+        Retrieves several queries with one batched encode and one batched Milvus search.
+        Returns one prediction per query, in the same order.
+        """
+        with tracing.span("encode", texts=len(search_queries)):
+            query_vectors = self.milvus_client.embedding_model.encode(search_queries)
+        results = self.milvus_client.search_vectors(query_vectors, top_k=self.k)
+        return [self.to_prediction(hits, query_vector=vec) for hits, vec in zip(results, query_vectors)]
+
+    async def asearch_many(self, search_queries: List[str]) -> List[dspy.Prediction]:
+        with tracing.span("encode", texts=len(search_queries)):
+            query_vectors = await asyncio.to_thread(self.milvus_client.embedding_model.encode, search_queries)
+        results = await self.milvus_client.asearch_vectors(query_vectors, top_k=self.k)
+        return [self.to_prediction(hits, query_vector=vec) for hits, vec in zip(results, query_vectors)]
+
+    def fuse(self, *retrievals: dspy.Prediction) -> dspy.Prediction:
+        """
+        Merges several retrievals into one top-k list with reciprocal-rank fusion.
+        """
+        fused = reciprocal_rank_fusion([r.raw_results for r in retrievals])[:self.k]
+        return self.to_prediction(fused)
+
+    @staticmethod
+    def to_prediction(results: List[Dict], **extra) -> dspy.Prediction:
         # Format for DSPy usage
         passages = []
         for res in results:
-            passages.append(f"[{res['source']}] {res['text']}")
+            passages.append(Passage(res['text'], res['source'], res['score']))
             
-        return dspy.Prediction(passages=passages, raw_results=results)
+        return dspy.Prediction(passages=passages, raw_results=results, **extra)
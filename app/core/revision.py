@@ -1,5 +1,7 @@
 import dspy
-from typing import List
+from typing import Any, Dict, List, Optional
+from app.core.context_packer import build_packer
+from app.core.prompt_layout import shared_prefix_layout
 
 class RevisionAgent(dspy.Module):
     """
@@ -7,13 +9,37 @@ class RevisionAgent(dspy.Module):
     """
     def __init__(self):
         super().__init__()
-        self.prog = dspy.ChainOfThought("question, context, past_answer, critique -> revised_answer")
+        self.packer = build_packer("revision")
+        self.prog = dspy.ChainOfThought("context, question, past_answer, critique -> revised_answer")
 
-    def forward(self, question: str, context: List[str], past_answer: str, critique: str):
-        context_str = "\n\n".join(context)
-        return self.prog(
-            question=question,
-            context=context_str,
-            past_answer=past_answer,
-            critique=critique
-        )
+    def forward(self, question: str, context: List[str], past_answer: str, critique: str,
+                config: Optional[Dict[str, Any]] = None):
+        """
+        `config` overrides LM settings for this call (e.g. a request timeout).
+        """
+        packed = self.packer.pack(context)
+        # Context first (as a shared system prefix) so prefix caching can hit across stages
+        with shared_prefix_layout():
+            prediction = self.prog(
+                context=self.packer.join(packed.passages),
+                question=question,
+                past_answer=past_answer,
+                critique=critique,
+                config=config or {}
+            )
+        prediction.context_tokens = packed.tokens_used
+        return prediction
+
+    async def aforward(self, question: str, context: List[str], past_answer: str, critique: str,
+                       config: Optional[Dict[str, Any]] = None):
+        packed = self.packer.pack(context)
+        with shared_prefix_layout():
+            prediction = await self.prog.acall(
+                context=self.packer.join(packed.passages),
+                question=question,
+                past_answer=past_answer,
+                critique=critique,
+                config=config or {}
+            )
+        prediction.context_tokens = packed.tokens_used
+        return prediction
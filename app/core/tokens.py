@@ -0,0 +1,64 @@
+from app.config import Config
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+@lru_cache(maxsize=8)
+def _get_encoding(model_name: str):
+    if tiktoken is None:
+        return None
+    # "openai/gpt-4o-mini" -> "gpt-4o-mini"
+    model_name = model_name.split("/")[-1]
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads its BPE files on first use; offline (and not cached) that fails
+        print(f"Tokenizer for {model_name} unavailable ({e}); estimating tokens instead.")
+        return None
+
+def token_counting(model_name: str = Config.LM_MODEL) -> str:
+    """
+    How count_tokens counts for the model: 'tiktoken' or 'estimate'.
+    """
+    return "tiktoken" if _get_encoding(model_name) is not None else "estimate"
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str, model_name: str = Config.LM_MODEL) -> int:
+    """
+    Counts prompt tokens for the target model.
+    Results are cached, so passages re-sent across stages are only tokenized once.
+    Falls back to a ~4 characters/token estimate when tiktoken or its encoding files are unavailable.
+    """
+    encoding = _get_encoding(model_name)
+    if encoding is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(encoding.encode(text))
+
+def truncate_tokens(text: str, max_tokens: int, model_name: str = Config.LM_MODEL) -> str:
+    """
+    Hard cut of text to at most max_tokens tokens (encode, slice, decode).
+    Without tiktoken, keeps whole words within the ~4 characters/token estimate.
+    """
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding(model_name)
+    if encoding is None:
+        kept, length = [], 0
+        for word in text.split():
+            length += len(word) + (1 if kept else 0)
+            if length // 4 > max_tokens:
+                break
+            kept.append(word)
+        # A single word longer than the budget is cut on characters
+        return " ".join(kept) if kept else text.strip()[:max_tokens * 4]
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    # A cut inside a multi-byte character decodes to a replacement character
+    return encoding.decode(tokens[:max_tokens]).rstrip("\ufffd")
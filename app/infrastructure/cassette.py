@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import inspect
+import threading
+import dspy
+from typing import Any, Dict, List, Optional
+from app.infrastructure.stub_lm import LMResponse
+from app.infrastructure.lm_usage import report_usage
+from app.config import Config
+
+# Per-call LM arguments that change the response (e.g. best-of-N temperatures); the LM's
+# own defaults and everything else (api keys, retries) are not part of the key
+KEY_KWARGS = ("temperature", "n", "rollout_id")
+
+class Cassette:
+    """
+    Recorded LM/BAML responses in a compact JSONL file, indexed in memory by a hash of
+    the request. Each line holds one call: {"k": key, "r": response, "s": latency_s}.
+    A request recorded several times (e.g. sampling) is replayed in recorded order.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.index: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursor: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._recording = False
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.index.setdefault(entry["k"], []).append(entry)
+        print(f"Cassette {path}: {sum(len(v) for v in self.index.values())} recorded calls")
+
+    @staticmethod
+    def key(request: Dict[str, Any]) -> str:
+        payload = json.dumps(request, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def start_recording(self):
+        """
+        Empties the cassette before the first call is recorded, so a re-recording replaces the
+        old responses instead of queueing behind them (replay serves entries in file order).
+        Safe to call from every wrapper sharing the cassette; only the first call truncates.
+        """
+        with self._lock:
+            if self._recording:
+                return
+            self._recording = True
+            self.index.clear()
+            self._cursor.clear()
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            open(self.path, "w").close()
+        print(f"Cassette {self.path}: recording from scratch")
+
+    def record(self, key: str, response: Any, latency_s: float):
+        entry = {"k": key, "r": response, "s": round(latency_s, 4)}
+        line = json.dumps(entry, separators=(",", ":"), default=str) + "\n"
+        self.start_recording()
+        with self._lock:
+            self.index.setdefault(key, []).append(entry)
+            with open(self.path, "a") as f:
+                f.write(line)
+
+    def replay(self, key: str) -> Dict[str, Any]:
+        """
+        The next recorded entry for the request (the last one repeats once exhausted).
+        Raises LookupError when the request was never recorded.
+        """
+        with self._lock:
+            entries = self.index.get(key)
+            if not entries:
+                raise LookupError(f"No recorded response in cassette {self.path} for this request; re-record it")
+            position = self._cursor.get(key, 0)
+            self._cursor[key] = position + 1
+            return entries[min(position, len(entries) - 1)]
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+def get_cassette(path: str = Config.LM_CASSETTE_PATH) -> Cassette:
+    """
+    One shared Cassette per file, so the DSPy and BAML wrappers write to the same index.
+    """
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+class CassetteLM(dspy.BaseLM):
+    """
+    Record/replay wrapper around a DSPy LM.
+    - record: empties the cassette, then calls the wrapped LM and appends each response and
+      its latency to it.
+    - replay: answers from the cassette without any network access, after the recorded
+      latency ('recorded') or immediately ('zero').
+    Usage (tokens) is replayed too, so LM usage reports and budgets behave as in the live run.
+    """
+    def __init__(self, lm: Optional[dspy.BaseLM] = None, mode: str = "replay", cassette: Optional[Cassette] = None,
+                 latency: str = Config.LM_CASSETTE_LATENCY):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode '{mode}'. Expected 'record' or 'replay'.")
+        if mode == "record" and lm is None:
+            raise ValueError("Recording needs the live LM to wrap.")
+        if latency not in ("recorded", "zero"):
+            raise ValueError(f"Unknown cassette latency '{latency}'. Expected 'recorded' or 'zero'.")
+        settings = {k: v for k, v in getattr(lm, "kwargs", {}).items() if k in ("temperature", "max_tokens")}
+        super().__init__(model=lm.model if lm is not None else Config.LM_MODEL, cache=False, **settings)
+        self.lm = lm
+        self.mode = mode
+        self.cassette = cassette or get_cassette()
+        self.latency = latency
+        if mode == "record":
+            self.cassette.start_recording()
+        if mode == "record" and getattr(lm, "cache", False):
+            print("Warning: recording through a cached LM; cache hits are recorded with near-zero latency.")
+
+    def forward(self, prompt: Optional[str] = None, messages: Optional[List[Dict[str, Any]]] = None, **kwargs):
+        key = self._key(prompt, messages, kwargs)
+        if self.mode == "record":
+            start = time.perf_counter()
+            response = self.lm.forward(prompt=prompt, messages=messages, **kwargs)
+            self.cassette.record(key, self._serialize(response), time.perf_counter() - start)
+            return response
+
+        entry = self.cassette.replay(key)
+        if self.latency == "recorded":
+            time.sleep(entry["s"])
+        return self._replayed(entry["r"])
+
+    async def aforward(self, prompt: Optional[str] = None, messages: Optional[List[Dict[str, Any]]] = None, **kwargs):
+        key = self._key(prompt, messages, kwargs)
+        if self.mode == "record":
+            start = time.perf_counter()
+            response = await self.lm.aforward(prompt=prompt, messages=messages, **kwargs)
+            self.cassette.record(key, self._serialize(response), time.perf_counter() - start)
+            return response
+
+        entry = self.cassette.replay(key)
+        if self.latency == "recorded":
+            await asyncio.sleep(entry["s"])
+        return self._replayed(entry["r"])
+
+    def _key(self, prompt: Optional[str], messages: Optional[List[Dict[str, Any]]], kwargs: Dict[str, Any]) -> str:
+        # The model is left out so a cassette replays regardless of the configured LM name
+        return self.cassette.key({
+            "prompt": prompt,
+            "messages": messages,
+            **{k: kwargs[k] for k in KEY_KWARGS if k in kwargs},
+        })
+
+    @staticmethod
+    def _serialize(response: Any) -> Dict[str, Any]:
+        """
+        Keeps only what DSPy reads: the choice texts and the usage (incl. cached prompt tokens).
+        """
+        def get(obj, name, default=None):
+            return obj.get(name, default) if isinstance(obj, dict) else getattr(obj, name, default)
+
+        usage = get(response, "usage") or {}
+        details = get(usage, "prompt_tokens_details") or {}
+        return {
+            "model": get(response, "model"),
+            "choices": [get(get(choice, "message"), "content") for choice in get(response, "choices", [])],
+            "usage": {
+                "prompt_tokens": get(usage, "prompt_tokens", 0),
+                "completion_tokens": get(usage, "completion_tokens", 0),
+                "total_tokens": get(usage, "total_tokens", 0),
+                "prompt_tokens_details": {"cached_tokens": get(details, "cached_tokens", 0) or 0},
+            },
+        }
+
+    def _replayed(self, recorded: Dict[str, Any]) -> LMResponse:
+        # The wrapped LM reports usage while recording; a replayed call reports it here
+        response = self._deserialize(recorded)
+        report_usage(self.model, response.usage)
+        return response
+
+    @staticmethod
+    def _deserialize(recorded: Dict[str, Any]) -> LMResponse:
+        return LMResponse(
+            model=recorded["model"],
+            choices=[
+                LMResponse(index=i, finish_reason="stop", message=LMResponse(role="assistant", content=content, tool_calls=None))
+                for i, content in enumerate(recorded["choices"])
+            ],
+            usage=LMResponse(recorded["usage"]),
+        )
+
+class CassetteBamlClient:
+    """
+    Record/replay proxy around a generated BAML client (sync `b` or async `b`).
+    Function calls are keyed by name and arguments; results are stored as their
+    pydantic data and rebuilt from baml_client.types on replay.
+    Note: streaming (`client.stream`) and other attributes pass through unrecorded.
+    """
+    def __init__(self, client: Any, mode: str = "replay", cassette: Optional[Cassette] = None,
+                 latency: str = Config.LM_CASSETTE_LATENCY):
+        self._client = client
+        self._mode = mode
+        self._cassette = cassette or get_cassette()
+        self._latency = latency
+        if mode == "record":
+            self._cassette.start_recording()
+
+    def __getattr__(self, name: str):
+        target = getattr(self._client, name)
+        if name == "stream" or not callable(target):
+            return target
+
+        if inspect.iscoroutinefunction(target):
+            async def acall(**kwargs):
+                key = self._cassette.key({"baml": name, "args": kwargs})
+                if self._mode == "record":
+                    start = time.perf_counter()
+                    result = await target(**kwargs)
+                    self._cassette.record(key, self._serialize(result), time.perf_counter() - start)
+                    return result
+                entry = self._cassette.replay(key)
+                if self._latency == "recorded":
+                    await asyncio.sleep(entry["s"])
+                return self._deserialize(entry["r"])
+            return acall
+
+        def call(**kwargs):
+            key = self._cassette.key({"baml": name, "args": kwargs})
+            if self._mode == "record":
+                start = time.perf_counter()
+                result = target(**kwargs)
+                self._cassette.record(key, self._serialize(result), time.perf_counter() - start)
+                return result
+            entry = self._cassette.replay(key)
+            if self._latency == "recorded":
+                time.sleep(entry["s"])
+            return self._deserialize(entry["r"])
+        return call
+
+    @staticmethod
+    def _serialize(result: Any) -> Dict[str, Any]:
+        if hasattr(result, "model_dump"):
+            return {"type": type(result).__name__, "data": result.model_dump(mode="json")}
+        return {"type": None, "data": result}
+
+    @staticmethod
+    def _deserialize(recorded: Dict[str, Any]) -> Any:
+        if recorded["type"] is None:
+            return recorded["data"]
+        from baml_client import types as baml_types
+        return getattr(baml_types, recorded["type"]).model_validate(recorded["data"])
+
+def wrap_lm(lm: dspy.BaseLM) -> dspy.BaseLM:
+    """
+    Wraps the LM in a CassetteLM when LM_CASSETTE_MODE is 'record' or 'replay'.
+    """
+    if not Config.LM_CASSETTE_MODE:
+        return lm
+    print(f"LM cassette: {Config.LM_CASSETTE_MODE} ({Config.LM_CASSETTE_PATH})")
+    return CassetteLM(lm if Config.LM_CASSETTE_MODE == "record" else None, mode=Config.LM_CASSETTE_MODE,
+                      cassette=get_cassette(Config.LM_CASSETTE_PATH), latency=Config.LM_CASSETTE_LATENCY)
+
+def wrap_baml(client: Any) -> Any:
+    """
+    Wraps a BAML client in a CassetteBamlClient when LM_CASSETTE_MODE is set.
+    """
+    if not Config.LM_CASSETTE_MODE or client is None:
+        return client
+    return CassetteBamlClient(client, mode=Config.LM_CASSETTE_MODE, cassette=get_cassette(Config.LM_CASSETTE_PATH),
+                              latency=Config.LM_CASSETTE_LATENCY)
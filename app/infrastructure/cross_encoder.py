@@ -0,0 +1,19 @@
+from sentence_transformers import CrossEncoder
+from app.config import Config
+from typing import List, Tuple
+
+class CrossEncoderModel:
+    def __init__(self, model_name: str = Config.CROSS_ENCODER_MODEL_NAME):
+        # Rerankers are small enough to run on CPU next to the embedding model
+        self.model = CrossEncoder(model_name, device="cpu")
+
+    def score(self, pairs: List[Tuple[str, str]], batch_size: int = Config.RERANKER_BATCH_SIZE) -> List[float]:
+        """
+        Score (question, passage) pairs jointly.
+        Returns one relevance score per pair (higher is more relevant).
+        """
+        if not pairs:
+            return []
+
+        scores = self.model.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+        return [float(s) for s in scores]
@@ -0,0 +1,66 @@
+import dspy
+import threading
+from typing import Dict, Any
+
+class LMUsageMeter:
+    """
+    Sums the LM usage (prompt, completion and cached prompt tokens) of the calls made
+    while the meter is active. While active, the meter is DSPy's usage tracker for the
+    current context (thread or asyncio task, plus worker threads started with a copy of
+    it), so concurrent requests on the same LM don't count each other's calls.
+    Meters nest: every call is also passed on to the tracker that was active before.
+    Note: dspy.LM reports provider calls only; responses from DSPy's cache cost nothing and aren't counted.
+    """
+    def __init__(self):
+        self.usage = self._empty()
+        self._lock = threading.Lock()
+        self._parent = None
+        self._context = None
+
+    def __enter__(self):
+        self._parent = dspy.settings.usage_tracker
+        self._context = dspy.context(usage_tracker=self)
+        self._context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._context.__exit__(exc_type, exc, tb)
+        return False
+
+    def add_usage(self, lm: str, usage_entry: Dict[str, Any]):
+        """
+        Usage tracker hook, called after each LM call made in this meter's context.
+        """
+        with self._lock:
+            self._add(usage_entry)
+        if self._parent is not None:
+            self._parent.add_usage(lm, usage_entry)
+
+    def read(self) -> Dict[str, int]:
+        """
+        Usage so far; can be called while the meter is still active.
+        """
+        with self._lock:
+            return dict(self.usage)
+
+    def _add(self, usage: Any):
+        get = usage.get if isinstance(usage, dict) else lambda key, default=None: getattr(usage, key, default)
+        details = get("prompt_tokens_details") or {}
+        cached = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", 0)
+
+        self.usage["calls"] += 1
+        self.usage["prompt_tokens"] += get("prompt_tokens", 0) or 0
+        self.usage["completion_tokens"] += get("completion_tokens", 0) or 0
+        self.usage["cached_prompt_tokens"] += cached or 0
+
+    @staticmethod
+    def _empty() -> Dict[str, int]:
+        return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_prompt_tokens": 0}
+
+def report_usage(model: str, usage: Dict[str, Any]):
+    """
+    Reports a call's usage to the active usage tracker, as dspy.LM does after each provider
+    call. Custom dspy.BaseLM subclasses (stub, cassette replay) call this themselves.
+    """
+    if dspy.settings.usage_tracker is not None:
+        dspy.settings.usage_tracker.add_usage(model, dict(usage))
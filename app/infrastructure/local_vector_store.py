@@ -0,0 +1,74 @@
+import re
+import time
+import zlib
+import asyncio
+import numpy as np
+from typing import List, Dict, Optional, Union
+from app.infrastructure import tracing
+
+class HashingEmbeddingModel:
+    """
+    Deterministic stand-in for EmbeddingModel that needs no model download: a hashed
+    bag of words, L2-normalized. Similar only in vocabulary, so only for offline benchmarks.
+    """
+    def __init__(self, dimension: int = 384):
+        self._dimension = dimension
+
+    def encode(self, texts: Union[str, List[str]]) -> List[List[float]]:
+        if isinstance(texts, str):
+            texts = [texts]
+
+        embeddings = np.zeros((len(texts), self._dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                embeddings[row, zlib.crc32(word.encode("utf-8")) % self._dimension] += 1.0
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return (embeddings / np.where(norms == 0, 1.0, norms)).tolist()
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
+
+class LocalVectorStore:
+    """
+    In-process stand-in for MilvusClient with the same insert/search interface.
+    Brute-force search returning squared L2 distances like Milvus' L2 metric, plus an
+    optional fixed search latency to model the network round trip.
+    """
+    def __init__(self, embedding_model=None, search_latency_s: float = 0.0):
+        self.embedding_model = embedding_model or HashingEmbeddingModel()
+        self.search_latency_s = search_latency_s
+        self.vectors = np.zeros((0, self.embedding_model.dimension), dtype=np.float32)
+        self.rows: List[Dict] = []
+
+    def insert_documents(self, documents: List[str], sources: List[str], metadatas: Optional[List[Dict]] = None):
+        vectors = np.asarray(self.embedding_model.encode(documents), dtype=np.float32)
+        for text, source, metadata in zip(documents, sources, metadatas or [{}] * len(documents)):
+            self.rows.append({"id": len(self.rows), "text": text, "source": source, "metadata": metadata})
+        self.vectors = np.vstack([self.vectors, vectors])
+        print(f"Inserted {len(documents)} documents into the local vector store.")
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict]:
+        return self.search_vectors(self.embedding_model.encode(query), top_k=top_k)[0]
+
+    def search_vectors(self, query_vectors: List[List[float]], top_k: int = 5) -> List[List[Dict]]:
+        with tracing.span("vector_search", nq=len(query_vectors), top_k=top_k):
+            if self.search_latency_s:
+                time.sleep(self.search_latency_s)
+            queries = np.asarray(query_vectors, dtype=np.float32)
+            distances = ((queries[:, None, :] - self.vectors[None, :, :]) ** 2).sum(axis=2)
+
+        results = []
+        for row_distances in distances:
+            order = np.argsort(row_distances, kind="stable")[:top_k]
+            results.append([{**self.rows[i], "score": float(row_distances[i])} for i in order])
+        return results
+
+    async def asearch_vectors(self, query_vectors: List[List[float]], top_k: int = 5) -> List[List[Dict]]:
+        return await asyncio.to_thread(self.search_vectors, query_vectors, top_k)
+
+    def warmup(self) -> float:
+        start = time.perf_counter()
+        if self.rows:
+            self.search("warmup", top_k=1)
+        return (time.perf_counter() - start) * 1000
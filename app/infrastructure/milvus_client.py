@@ -1,3 +1,5 @@
+import time
+import asyncio
 from pymilvus import (
     connections,
     utility,
@@ -8,6 +10,7 @@ from pymilvus import (
 )
 from app.config import Config
 from app.infrastructure.embedding_model import EmbeddingModel
+from app.infrastructure import tracing
 from typing import List, Dict, Any, Optional
 
 class MilvusClient:
@@ -85,30 +88,57 @@ class MilvusClient:
         Search for relevant documents.
         """
         query_vector = self.embedding_model.encode(query) # List[List[float]]
-        
+        return self.search_vectors(query_vector, top_k=top_k)[0]
+
+    def search_vectors(self, query_vectors: List[List[float]], top_k: int = 5) -> List[List[Dict]]:
+        """
+        Search with pre-computed query embeddings.
+        Returns one list of hits per query vector, in the same order.
+        """
         search_params = {
             "metric_type": "L2",
             "params": {"nprobe": 10},
         }
         
-        results = self.collection.search(
-            data=query_vector,
-            anns_field="vector",
-            param=search_params,
-            limit=top_k,
-            output_fields=["text", "source", "metadata"]
-        )
+        with tracing.span("milvus_search", nq=len(query_vectors), top_k=top_k):
+            results = self.collection.search(
+                data=query_vectors,
+                anns_field="vector",
+                param=search_params,
+                limit=top_k,
+                output_fields=["text", "source", "metadata"]
+            )
         
         # Format results
-        hits = results[0]
         formatted_results = []
-        for hit in hits:
-            formatted_results.append({
-                "id": hit.id,
-                "score": hit.score,
-                "text": hit.entity.get("text"),
-                "source": hit.entity.get("source"),
-                "metadata": hit.entity.get("metadata")
-            })
+        for hits in results:
+            formatted_hits = []
+            for hit in hits:
+                formatted_hits.append({
+                    "id": hit.id,
+                    "score": hit.score,
+                    "text": hit.entity.get("text"),
+                    "source": hit.entity.get("source"),
+                    "metadata": hit.entity.get("metadata")
+                })
+            formatted_results.append(formatted_hits)
             
         return formatted_results
+
+    def warmup(self) -> float:
+        """
+        Runs a dummy encode and search so the encoder's first forward pass and the
+        collection's first query are not paid by a user request. Returns the time taken (ms).
+        """
+        start = time.perf_counter()
+        self.search_vectors(self.embedding_model.encode("warmup"), top_k=1)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"Milvus warmup (encode + search): {elapsed_ms:.0f} ms")
+        return elapsed_ms
+
+    async def asearch_vectors(self, query_vectors: List[List[float]], top_k: int = 5) -> List[List[Dict]]:
+        """
+        Async variant of search_vectors. The ORM client is blocking, so the search runs
+        in a worker thread and the event loop stays free for other requests.
+        """
+        return await asyncio.to_thread(self.search_vectors, query_vectors, top_k)
@@ -0,0 +1,126 @@
+import re
+import time
+import json
+import random
+import asyncio
+import dspy
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.tokens import count_tokens
+from app.infrastructure.lm_usage import report_usage
+
+FIELD_MARKER = re.compile(r"\[\[ ## (\w+) ## \]\]")
+# "1. `score` (str): Quality score from 0 to 10" in the adapter's system message
+FIELD_DECLARATION = re.compile(r"\d+\. `(\w+)` \(([^)]*)\)")
+INPUT_BLOCK = re.compile(r"\[\[ ## (\w+) ## \]\]\n(.*?)(?=\n\n\[\[ ## |\n\nRespond with|\Z)", re.DOTALL)
+
+# Values that keep the pipeline on its normal path (the critic passes, no sub-queries)
+DEFAULT_FIELD_VALUES = {
+    "score": "9",
+    "passed": "true",
+    "confidence": "0.9",
+    "intent": "lookup",
+    "entities": "",
+    "revised_answer": "",
+}
+
+class LMResponse(dict):
+    """
+    Dict with attribute access, shaped like a LiteLLM response for dspy.BaseLM.
+    """
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+class StubLM(dspy.BaseLM):
+    """
+    Deterministic offline LM for benchmarks. It reads the output fields requested by
+    DSPy's ChatAdapter (`[[ ## field ## ]]` markers, with their declared types) and
+    answers every field with a fixed, type-appropriate value.
+
+    Latency is latency_s + latency_per_1k_tokens_s per 1K prompt tokens (plus seeded
+    jitter); usage reports the real prompt token count and completion_tokens.
+    field_values overrides the value of any output field (e.g. {"score": "4"} to
+    make the critic revise).
+    """
+    def __init__(self, latency_s: float = 0.05, latency_per_1k_tokens_s: float = 0.02, completion_tokens: int = 60,
+                 jitter_s: float = 0.0, field_values: Optional[Dict[str, str]] = None, seed: int = 0):
+        super().__init__(model="stub/offline", model_type="chat", temperature=0.0, max_tokens=1000, cache=False)
+        self.latency_s = latency_s
+        self.latency_per_1k_tokens_s = latency_per_1k_tokens_s
+        self.completion_tokens = completion_tokens
+        self.jitter_s = jitter_s
+        self.field_values = {**DEFAULT_FIELD_VALUES, **(field_values or {})}
+        self._random = random.Random(seed)
+
+    def forward(self, prompt: Optional[str] = None, messages: Optional[List[Dict[str, Any]]] = None, **kwargs):
+        response, delay_s = self._respond(prompt, messages)
+        time.sleep(delay_s)
+        report_usage(self.model, response.usage)
+        return response
+
+    async def aforward(self, prompt: Optional[str] = None, messages: Optional[List[Dict[str, Any]]] = None, **kwargs):
+        response, delay_s = self._respond(prompt, messages)
+        await asyncio.sleep(delay_s)
+        report_usage(self.model, response.usage)
+        return response
+
+    def _respond(self, prompt: Optional[str], messages: Optional[List[Dict[str, Any]]]) -> Tuple[LMResponse, float]:
+        messages = messages or [{"role": "user", "content": prompt or ""}]
+        texts = [str(m.get("content") or "") for m in messages]
+        prompt_tokens = sum(count_tokens(text) for text in texts)
+
+        fields = self._output_fields(texts[0], texts[-1])
+        inputs = dict(INPUT_BLOCK.findall(texts[-1]))
+        content = "".join(f"[[ ## {name} ## ]]\n{self._value(name, kind, inputs)}\n\n" for name, kind in fields)
+        content += "[[ ## completed ## ]]"
+
+        delay_s = self.latency_s + self.latency_per_1k_tokens_s * prompt_tokens / 1000
+        if self.jitter_s:
+            delay_s += self._random.uniform(0, self.jitter_s)
+
+        response = LMResponse(
+            model=self.model,
+            choices=[LMResponse(index=0, finish_reason="stop", message=LMResponse(role="assistant", content=content, tool_calls=None))],
+            usage=LMResponse(prompt_tokens=prompt_tokens, completion_tokens=self.completion_tokens,
+                         total_tokens=prompt_tokens + self.completion_tokens),
+        )
+        return response, delay_s
+
+    @staticmethod
+    def _output_fields(system: str, request: str) -> List[Tuple[str, str]]:
+        """
+        (name, type) of the requested output fields, in order. Types come from the
+        "Your output fields are:" section of the system message.
+        """
+        declared = {}
+        if "Your output fields are:" in system:
+            section = system.split("Your output fields are:", 1)[1].split("All interactions will be structured", 1)[0]
+            declared = dict(FIELD_DECLARATION.findall(section))
+
+        # The closing instruction names every output field in order
+        instruction = request.rsplit("Respond with the corresponding output fields", 1)[-1]
+        names = [n for n in dict.fromkeys(FIELD_MARKER.findall(instruction)) if n != "completed"]
+        return [(name, declared.get(name, "str")) for name in (names or list(declared))]
+
+    def _value(self, name: str, kind: str, inputs: Dict[str, str]) -> str:
+        if name in self.field_values:
+            return self.field_values[name]
+        if name == "search_query" and "user_query" in inputs:
+            return inputs["user_query"].strip()
+        kind = kind.lower()
+        if kind.startswith("list[int"):
+            return "[0, 1, 2]"
+        if kind.startswith("list[float"):
+            return "[0.9, 0.8, 0.7]"
+        if kind.startswith("list"):
+            return "[]"
+        if kind in ("int", "float"):
+            return "1"
+        if kind == "bool":
+            return "true"
+        if kind.startswith("dict"):
+            return json.dumps({})
+        question = inputs.get("question", "").strip()
+        return f"Stub {name.replace('_', ' ')} for: {question}" if question else f"Stub {name.replace('_', ' ')}."
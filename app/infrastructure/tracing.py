@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import uuid
+import queue
+import atexit
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from app.infrastructure.lm_usage import LMUsageMeter
+from app.config import Config
+
+# Active trace and span of the current request. Context variables follow asyncio tasks;
+# plain worker threads start without them, so their spans are silently dropped.
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# Finished traces waiting for the background writer; when it falls behind, new traces are dropped
+_export_queue = queue.Queue(maxsize=1000)
+_writer = None
+_writer_lock = threading.Lock()
+_dropped = 0
+
+class Span:
+    """
+    One timed stage of a request. Attributes carry stage details such as token counts
+    and cache hits; names follow the OTLP span model (ids, parent id, unix-nano times).
+    """
+    __slots__ = ("name", "span_id", "parent_span_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent_span_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_span_id = parent_span_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def set_usage(self, usage: Dict[str, int]):
+        """
+        Copies LM usage (see LMUsageMeter) onto the span.
+        """
+        self.attributes.update({k: v for k, v in usage.items() if v})
+
+class _NoopSpan:
+    """
+    Returned outside of a trace (or with tracing disabled), so instrumented code never branches.
+    """
+    def set(self, **attributes):
+        pass
+
+    def set_usage(self, usage: Dict[str, int]):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class Trace:
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()
+        self.root = self._open(name, None, attributes)
+
+    def _open(self, name: str, parent_span_id: Optional[str], attributes: Dict[str, Any]) -> Span:
+        span = Span(name, parent_span_id, attributes)
+        with self.lock:
+            self.spans.append(span)
+        return span
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """
+        The spans as OTLP-style records (one JSONL line each).
+        """
+        return [{
+            "trace_id": self.trace_id,
+            "span_id": span.span_id,
+            "parent_span_id": span.parent_span_id,
+            "name": span.name,
+            "start_time_unix_nano": span.start_ns,
+            "end_time_unix_nano": span.end_ns if span.end_ns is not None else span.start_ns,
+            "attributes": span.attributes,
+        } for span in self.spans]
+
+    def waterfall(self) -> List[Dict[str, Any]]:
+        """
+        The spans relative to the start of the trace, in milliseconds, for display.
+        """
+        origin = self.root.start_ns
+        depth = {}
+        rows = []
+        for span in self.spans:
+            depth[span.span_id] = depth.get(span.parent_span_id, -1) + 1
+            end_ns = span.end_ns if span.end_ns is not None else span.start_ns
+            rows.append({
+                "name": span.name,
+                "depth": depth[span.span_id],
+                "start_ms": round((span.start_ns - origin) / 1e6, 1),
+                "duration_ms": round((end_ns - span.start_ns) / 1e6, 1),
+                **span.attributes,
+            })
+        return rows
+
+@contextmanager
+def trace(name: str, **attributes):
+    """
+    Opens a request trace. On exit the spans are queued for TRACE_FILE (if set).
+    Yields the Trace, or None when tracing is disabled.
+    """
+    if not Config.TRACING_ENABLED:
+        yield None
+        return
+
+    request_trace = Trace(name, attributes)
+    trace_token = _current_trace.set(request_trace)
+    span_token = _current_span.set(request_trace.root)
+    try:
+        yield request_trace
+    finally:
+        request_trace.root.end_ns = time.time_ns()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        _export(request_trace)
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Times a stage as a child of the current span. A no-op outside of a trace.
+    """
+    request_trace = _current_trace.get()
+    if request_trace is None:
+        yield _NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    current = request_trace._open(name, parent.span_id if parent else None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+@contextmanager
+def metered_span(name: str, **attributes):
+    """
+    span() that also records the LM usage (tokens, cached tokens) of the calls inside it.
+    """
+    with span(name, **attributes) as current:
+        if current is _NOOP_SPAN:
+            yield current
+            return
+        with LMUsageMeter() as meter:
+            yield current
+        current.set_usage(meter.usage)
+
+def event(name: str, **attributes):
+    """
+    Records an instantaneous span (e.g. a cache hit that replaced a stage).
+    """
+    with span(name, **attributes):
+        pass
+
+def flush():
+    """
+    Blocks until every queued trace has been written (called at exit).
+    """
+    if _writer is not None:
+        _export_queue.join()
+
+def _export(request_trace: Trace):
+    """
+    Hands the trace to the background writer, so requests never wait on file I/O.
+    """
+    global _dropped
+    if not Config.TRACE_FILE:
+        return
+    _start_writer()
+    try:
+        _export_queue.put_nowait((Config.TRACE_FILE, request_trace.to_records()))
+    except queue.Full:
+        _dropped += 1
+        if _dropped % 100 == 1:
+            print(f"Trace writer is falling behind: {_dropped} traces dropped so far.")
+
+def _start_writer():
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_loop, name="trace-writer", daemon=True)
+            _writer.start()
+            atexit.register(flush)
+
+def _write_loop():
+    while True:
+        path, records = _export_queue.get()
+        try:
+            _append(path, "".join(json.dumps(record, default=str) + "\n" for record in records))
+        except Exception as e:
+            print(f"Trace export to {path} failed: {e}")
+        finally:
+            _export_queue.task_done()
+
+def _append(path: str, lines: str):
+    """
+    Appends to the trace file, first rotating it to `<path>.1` (replacing the previous
+    one) when the write would take it past TRACE_FILE_MAX_BYTES.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    limit = Config.TRACE_FILE_MAX_BYTES
+    if limit > 0 and os.path.exists(path) and os.path.getsize(path) + len(lines) > limit:
+        os.replace(path, path + ".1")
+    with open(path, "a") as f:
+        f.write(lines)
@@ -0,0 +1,138 @@
+import dspy
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Callable
+from app.core.generation import AnswerGenerator
+from app.core.critic import CriticAgent, parse_score
+from app.core.revision import RevisionAgent
+from app.config import Config
+
+class BestOfNGenerator(dspy.Module):
+    """
+    Alternative to the serial critic loop: samples N candidate answers concurrently
+    (spread over a temperature range), scores them concurrently with the critic and
+    keeps the best one, optionally revising only the winner.
+    Wall-clock cost is ~1 generation + 1 critique (+ 1 revision) regardless of N.
+    """
+    def __init__(self, generator: AnswerGenerator, critic: CriticAgent, reviser: RevisionAgent,
+                 n: int = Config.BEST_OF_N, max_workers: int = Config.BEST_OF_N_MAX_WORKERS,
+                 min_temperature: float = Config.BEST_OF_N_MIN_TEMPERATURE,
+                 max_temperature: float = Config.BEST_OF_N_MAX_TEMPERATURE,
+                 revise_winner: bool = Config.BEST_OF_N_REVISE_WINNER):
+        super().__init__()
+        self.generator = generator
+        self.critic = critic
+        self.reviser = reviser
+        self.n = max(1, n)
+        self.max_workers = max(1, max_workers)
+        self.revise_winner = revise_winner
+        step = (max_temperature - min_temperature) / (self.n - 1) if self.n > 1 else 0.0
+        self.temperatures = [round(min_temperature + i * step, 2) for i in range(self.n)]
+
+    def forward(self, question: str, context: List[str], on_revision: Optional[Callable[[str], None]] = None):
+        print(f"\n--- Best-of-{self.n} (temperatures {self.temperatures}, {self.max_workers} workers) ---")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def run_all(fn, items):
+                # Each worker runs in a copy of the caller's context (LM, usage meter, trace spans)
+                futures = [executor.submit(contextvars.copy_context().run, fn, item) for item in items]
+                return [future.result() for future in futures]
+
+            # 1. Generate candidates concurrently
+            generations = run_all(
+                lambda t: self.generator(context=context, question=question, config={"temperature": t}),
+                self.temperatures
+            )
+            # 2. Score every candidate concurrently
+            critiques = run_all(
+                lambda g: self.critic(question=question, context=context, answer=g.answer),
+                generations
+            )
+
+        result = self._select(generations, critiques)
+        if self._needs_revision(result):
+            # Only the winner is revised
+            revision_res = self.reviser(**self._revision_inputs(result, question, context))
+            result = self._apply_revision(result, revision_res, on_revision)
+        return result
+
+    async def aforward(self, question: str, context: List[str], on_revision: Optional[Callable[[str], None]] = None):
+        """
+        Async variant of forward: candidates and critiques run as tasks, at most max_workers at a time.
+        """
+        print(f"\n--- Best-of-{self.n} (temperatures {self.temperatures}, {self.max_workers} in flight) ---")
+        limit = asyncio.Semaphore(self.max_workers)
+
+        async def bounded(module, **kwargs):
+            async with limit:
+                return await module.acall(**kwargs)
+
+        generations = await asyncio.gather(*[
+            bounded(self.generator, context=context, question=question, config={"temperature": t})
+            for t in self.temperatures
+        ])
+        critiques = await asyncio.gather(*[
+            bounded(self.critic, question=question, context=context, answer=g.answer) for g in generations
+        ])
+
+        result = self._select(generations, critiques)
+        if self._needs_revision(result):
+            revision_res = await self.reviser.acall(**self._revision_inputs(result, question, context))
+            result = self._apply_revision(result, revision_res, on_revision)
+        return result
+
+    def _select(self, generations: List[dspy.Prediction], critiques: List[dspy.Prediction]) -> dspy.Prediction:
+        """
+        Picks the best-scoring candidate; the result has the critic loop's output shape.
+        """
+        history = []
+        for i, (temperature, generation, critique_res) in enumerate(zip(self.temperatures, generations, critiques)):
+            history.append({
+                "iteration": i + 1,
+                "answer": generation.answer,
+                "critique": critique_res.critique,
+                "score": parse_score(critique_res.score),
+                "passed": critique_res.passed,
+                "temperature": temperature
+            })
+            print(f"Candidate {i+1} (t={temperature}): score {history[-1]['score']}/10")
+
+        # max() keeps the first (lowest-temperature) candidate on ties
+        best = max(range(len(history)), key=lambda i: history[i]["score"])
+        final_score = history[best]["score"]
+        passed = final_score >= 9.0 or str(history[best]["passed"]).lower() == "true"
+        print(f"Winner: candidate {best+1} ({final_score}/10)")
+
+        return dspy.Prediction(
+            generation=generations[best],
+            generation_calls=self.n,
+            final_answer=history[best]["answer"],
+            winner_critique=history[best]["critique"],
+            history=history,
+            final_score=final_score,
+            num_revisions=0,
+            lm_calls=self.n, # Critiques; generation calls are reported separately
+            context_tokens={"critic": sum(c.get("context_tokens", 0) for c in critiques), "revision": 0},
+            grounding=None,
+            critic_skipped=False,
+            stop_reason="passed" if passed else "best_of_n"
+        )
+
+    def _needs_revision(self, result: dspy.Prediction) -> bool:
+        return self.revise_winner and result.stop_reason != "passed"
+
+    def _revision_inputs(self, result: dspy.Prediction, question: str, context: List[str]) -> dict:
+        print("Revising the winner...")
+        return dict(question=question, context=context, past_answer=result.final_answer, critique=result.winner_critique)
+
+    @staticmethod
+    def _apply_revision(result: dspy.Prediction, revision_res: dspy.Prediction,
+                        on_revision: Optional[Callable[[str], None]]) -> dspy.Prediction:
+        result.final_answer = revision_res.revised_answer
+        result.context_tokens["revision"] = revision_res.get("context_tokens", 0)
+        result.lm_calls += 1
+        result.num_revisions = 1
+        if on_revision:
+            on_revision(result.final_answer)
+        return result
@@ -0,0 +1,230 @@
+import copy
+import math
+import time
+import queue
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, Optional
+from app.infrastructure.lm_usage import LMUsageMeter
+from app.config import Config
+try:
+    from litellm.exceptions import Timeout as LMTimeout
+except ImportError:
+    LMTimeout = TimeoutError
+
+# What an LM call raises when it runs out of time: our deadline or the provider's request timeout
+DEADLINE_ERRORS = (TimeoutError, LMTimeout)
+
+# Degradation tiers, least to most severe: what a request gave up to meet its deadline
+DEGRADATION_TIERS = ["full", "no_critic", "no_llm_rank", "no_rewrite", "extractive"]
+
+class Budget:
+    """
+    Wall-clock, token and cost budget of a single request. The clock starts on creation;
+    tokens and cost are read from `meter`, which the caller enters around the request's
+    LM calls (it stays at zero until then). A limit of 0/None means unlimited.
+    """
+    def __init__(self, deadline_s: Optional[float] = Config.REQUEST_DEADLINE_S,
+                 max_tokens: Optional[int] = Config.REQUEST_MAX_TOKENS,
+                 max_cost: Optional[float] = Config.REQUEST_MAX_COST):
+        self.deadline_s = deadline_s or None
+        self.max_tokens = max_tokens or None
+        self.max_cost = max_cost or None
+        self.start = time.perf_counter()
+        self.meter = LMUsageMeter()
+        self.degraded = set()
+
+    @property
+    def elapsed_s(self) -> float:
+        return time.perf_counter() - self.start
+
+    @property
+    def remaining_s(self) -> Optional[float]:
+        return None if self.deadline_s is None else self.deadline_s - self.elapsed_s
+
+    @property
+    def tokens_used(self) -> int:
+        usage = self.meter.read()
+        return usage["prompt_tokens"] + usage["completion_tokens"]
+
+    @property
+    def cost_used(self) -> float:
+        usage = self.meter.read()
+        return self.cost(usage["prompt_tokens"], usage["completion_tokens"])
+
+    def exceeded_by(self, seconds: float = 0.0, prompt_tokens: int = 0, completion_tokens: int = 0) -> Optional[str]:
+        """
+        Checks whether spending the given estimate on top of what was used would break the budget.
+        Returns the name of the first limit it would exceed ('deadline', 'tokens', 'cost'), or None.
+        """
+        if self.deadline_s is not None and self.elapsed_s + seconds > self.deadline_s:
+            return "deadline"
+        if self.max_tokens is not None and self.tokens_used + prompt_tokens + completion_tokens > self.max_tokens:
+            return "tokens"
+        if self.max_cost is not None and self.cost_used + self.cost(prompt_tokens, completion_tokens) > self.max_cost:
+            return "cost"
+        return None
+
+    def affords(self, seconds: float) -> bool:
+        """
+        Whether `seconds` more work still fits before the deadline.
+        """
+        return self.remaining_s is None or self.remaining_s >= seconds
+
+    def degrade(self, tier: str):
+        self.degraded.add(tier)
+        print(f"Degrading to '{tier}': {max(self.remaining_s or 0.0, 0.0):.1f}s left of the {self.deadline_s}s deadline")
+
+    @property
+    def tier(self) -> str:
+        """
+        The most severe degradation tier applied to the request ('full' if none).
+        """
+        return max(self.degraded, key=DEGRADATION_TIERS.index, default="full")
+
+    def bounded(self, seconds: float) -> "Budget":
+        """
+        A view of this budget whose deadline is at most `seconds` from now (e.g. a stage
+        timeout). It shares the usage meter and the degradation tiers with this budget.
+        """
+        bounded = copy.copy(self)
+        remaining = self.remaining_s
+        bounded.start = time.perf_counter()
+        bounded.deadline_s = seconds if remaining is None else max(min(seconds, remaining), 0.0)
+        return bounded
+
+    def lm_config(self) -> Dict[str, Any]:
+        """
+        Per-call LM settings (DSPy `config`) that make the provider give up near the deadline.
+        The remaining time is rounded up to a power of two seconds: the timeout is part of the
+        LM cache key, so a few coarse values keep repeated requests hitting the cache.
+        call()/acall() enforce the exact deadline.
+        """
+        remaining = self.remaining_s
+        if remaining is None:
+            return {}
+        return {"timeout": 2 ** max(0, math.ceil(math.log2(max(remaining, 1.0))))}
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """
+        Runs fn(*args, **kwargs), raising TimeoutError once the deadline passes. The call runs
+        in a daemon thread with a copy of the caller's context; a call that overruns is
+        abandoned (a thread can't be cancelled) while the request moves on.
+        """
+        remaining = self.remaining_s
+        if remaining is None:
+            return fn(*args, **kwargs)
+        if remaining <= 0:
+            raise TimeoutError("Request deadline already passed")
+        future = Future()
+        context = contextvars.copy_context()
+
+        def run():
+            try:
+                future.set_result(context.run(fn, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="deadline-call", daemon=True).start()
+        try:
+            return future.result(timeout=remaining)
+        except FutureTimeout:
+            if future.done():
+                raise # The call itself timed out
+            raise TimeoutError(f"Request deadline ({self.deadline_s}s) passed during the call")
+
+    async def acall(self, awaitable: Awaitable):
+        """
+        Async variant of call: awaits with the remaining time, cancelling the call at the deadline.
+        """
+        remaining = self.remaining_s
+        if remaining is None:
+            return await awaitable
+        task = asyncio.ensure_future(awaitable)
+        if remaining <= 0:
+            task.cancel()
+            raise TimeoutError("Request deadline already passed")
+        done, _ = await asyncio.wait({task}, timeout=remaining)
+        if not done:
+            task.cancel()
+            raise TimeoutError(f"Request deadline ({self.deadline_s}s) passed during the call")
+        return task.result()
+
+    def stream(self, iterator: Iterator) -> Iterator:
+        """
+        Yields (item, produced_at) for each item of a (blocking) iterator, raising TimeoutError
+        when the next item doesn't arrive before the deadline. The iterator is drained by a
+        daemon thread with a copy of the caller's context, so produced_at (time.perf_counter())
+        is when the item was ready, not when the consumer got around to it.
+        """
+        items = queue.Queue()
+        context = contextvars.copy_context()
+
+        def pump():
+            try:
+                for item in iterator:
+                    items.put((item, time.perf_counter(), None))
+                items.put((None, None, StopIteration()))
+            except BaseException as e:
+                items.put((None, None, e))
+
+        threading.Thread(target=context.run, args=(pump,), name="deadline-stream", daemon=True).start()
+        while True:
+            remaining = self.remaining_s
+            try:
+                item, produced_at, error = items.get(timeout=None if remaining is None else max(remaining, 0.0))
+            except queue.Empty:
+                raise TimeoutError(f"Request deadline ({self.deadline_s}s) passed while streaming")
+            if isinstance(error, StopIteration):
+                return
+            if error is not None:
+                raise error
+            yield item, produced_at
+
+    @staticmethod
+    def cost(prompt_tokens: int, completion_tokens: int) -> float:
+        return (prompt_tokens * Config.LM_PROMPT_COST_PER_1K + completion_tokens * Config.LM_COMPLETION_COST_PER_1K) / 1000
+
+class StageCostTracker:
+    """
+    Rolling per-stage measurements (latency and LM tokens) used to predict what
+    the next call of a stage will cost.
+    """
+    def __init__(self, window: int = 20):
+        self.history = defaultdict(lambda: deque(maxlen=window))
+        # Shared by concurrent requests; readers take a snapshot so an append can't
+        # mutate a deque while it is being summed
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, usage: Optional[Dict[str, int]] = None):
+        usage = usage or {"prompt_tokens": 0, "completion_tokens": 0}
+        with self._lock:
+            self.history[stage].append((seconds, usage["prompt_tokens"], usage["completion_tokens"]))
+
+    def seconds(self, stage: str, default: float = 0.0) -> float:
+        """
+        Mean measured latency of a stage, or `default` before it has been measured.
+        """
+        samples = self._samples(stage)
+        return sum(s[0] for s in samples) / len(samples) if samples else default
+
+    def estimate(self, stages: Iterable[str]) -> Optional[Dict[str, float]]:
+        """
+        Mean cost of running the given stages once; None until every stage has been measured.
+        """
+        total = {"seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+        for stage in stages:
+            samples = self._samples(stage)
+            if not samples:
+                return None
+            total["seconds"] += sum(s[0] for s in samples) / len(samples)
+            total["prompt_tokens"] += round(sum(s[1] for s in samples) / len(samples))
+            total["completion_tokens"] += round(sum(s[2] for s in samples) / len(samples))
+        return total
+
+    def _samples(self, stage: str) -> list:
+        with self._lock:
+            return list(self.history[stage])
@@ -0,0 +1,71 @@
+import threading
+from app.config import Config
+from typing import List, Dict
+
+class RankingCascade:
+    """
+    Decides how much ranking effort a query needs from the Milvus score distribution.
+
+    - "skip":  the top hit is close and clearly ahead of hit 2 -> keep the vector order
+    - "local": a moderate gap -> cheap CPU cross-encoder rerank
+    - "llm":   no clear winner -> escalate to the configured ranker (LLM by default)
+    """
+    SKIP = "skip"
+    LOCAL = "local"
+    LLM = "llm"
+
+    def __init__(
+        self,
+        skip_gap: float = Config.CASCADE_SKIP_GAP,
+        local_gap: float = Config.CASCADE_LOCAL_GAP,
+        max_distance: float = Config.CASCADE_MAX_DISTANCE,
+    ):
+        self.skip_gap = skip_gap
+        self.local_gap = local_gap
+        self.max_distance = max_distance
+        self._lock = threading.Lock() # Shared by concurrent requests
+        self.stats = {self.SKIP: 0, self.LOCAL: 0, self.LLM: 0}
+
+    def decide(self, raw_results: List[Dict]) -> str:
+        """
+        Picks a ranking tier from the search hits (L2 distances, lower is closer).
+        """
+        distances = [hit["score"] for hit in raw_results]
+
+        if len(distances) < 2:
+            # Zero or one passage: there is nothing to reorder
+            decision, gap = self.SKIP, None
+        else:
+            gap = distances[1] - distances[0]
+            if distances[0] <= self.max_distance and gap >= self.skip_gap:
+                decision = self.SKIP
+            elif gap >= self.local_gap:
+                decision = self.LOCAL
+            else:
+                decision = self.LLM
+
+        with self._lock:
+            self.stats[decision] += 1
+            total, avoided_rate = self._total(), self._avoided_rate()
+        top = f"{distances[0]:.3f}" if distances else "n/a"
+        gap_str = f"{gap:.3f}" if gap is not None else "n/a"
+        print(f"Ranking cascade: {decision} (top distance {top}, gap {gap_str}) | "
+              f"LLM ranking avoided for {avoided_rate:.0%} of {total} queries")
+        return decision
+
+    @property
+    def total(self) -> int:
+        with self._lock:
+            return self._total()
+
+    @property
+    def avoided_rate(self) -> float:
+        with self._lock:
+            return self._avoided_rate()
+
+    def _total(self) -> int:
+        return sum(self.stats.values())
+
+    def _avoided_rate(self) -> float:
+        total = self._total()
+        return (total - self.stats[self.LLM]) / total if total else 0.0
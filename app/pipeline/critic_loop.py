@@ -1,60 +1,321 @@
 import dspy
-from app.core.critic import CriticAgent
+import time
+import asyncio
+import threading
+import numpy as np
+from app.core.critic import CriticAgent, parse_score
 from app.core.revision import RevisionAgent
-from typing import List, Dict
+from app.core.critique_revise import CritiqueReviseAgent
+from app.core.grounding import GroundingScorer
+from app.pipeline.budget import Budget, StageCostTracker, DEADLINE_ERRORS
+from app.pipeline.critique_memo import CritiqueMemo
+from app.infrastructure.lm_usage import LMUsageMeter
+from app.infrastructure import tracing
+from app.config import Config
+from typing import List, Dict, Optional, Callable
 
 class MultiAgentCriticLoop(dspy.Module):
-    def __init__(self, max_iterations: int = 3):
+    def __init__(self, max_iterations: int = 3, grounding: Optional[GroundingScorer] = None,
+                 mode: str = Config.CRITIC_LOOP_MODE, embedding_model=None,
+                 convergence_threshold: float = Config.CRITIC_CONVERGENCE_THRESHOLD):
         super().__init__()
         self.max_iterations = max_iterations
+        self.grounding = grounding
         self.critic = CriticAgent()
         self.reviser = RevisionAgent()
+        # 'combined' critiques and revises in one LM call, falling back to 'separate' calls
+        if mode not in ("separate", "combined"):
+            raise ValueError(f"Unknown critic loop mode '{mode}'. Expected 'separate' or 'combined'.")
+        self.critique_revise = CritiqueReviseAgent() if mode == "combined" else None
+        self._stats_lock = threading.Lock() # Shared by concurrent requests
+        self.stats = {"combined": 0, "fallbacks": 0, "memo_hits": 0, "converged": 0}
+        # Verdicts shared across iterations and requests, and the encoder used for convergence checks
+        self.memo = CritiqueMemo() if Config.CRITIC_MEMO_SIZE > 0 else None
+        self.embedding_model = embedding_model
+        self.convergence_threshold = convergence_threshold
+        # Measured latency/tokens per stage, used to predict the cost of the next round
+        self.costs = StageCostTracker()
 
-    def forward(self, question: str, context: List[str], initial_answer: str):
+    def forward(self, question: str, context: List[str], initial_answer: str,
+                on_revision: Optional[Callable[[str], None]] = None, budget: Optional[Budget] = None,
+                max_iterations: Optional[int] = None):
+        """
+        max_iterations overrides the configured number of rounds for this call.
+        """
+        steps = self._steps(question, context, initial_answer, on_revision, budget, max_iterations)
+        try:
+            call = next(steps)
+            while True:
+                stage, step, kwargs = call
+                if not isinstance(step, dspy.Module):
+                    call = steps.send(step(**kwargs))
+                    continue
+                try:
+                    result = self._measured(stage, step, budget, **kwargs)
+                except DEADLINE_ERRORS as e:
+                    call = steps.throw(e)
+                else:
+                    call = steps.send(result)
+        except StopIteration as done:
+            return done.value
+
+    async def aforward(self, question: str, context: List[str], initial_answer: str,
+                       on_revision: Optional[Callable[[str], None]] = None, budget: Optional[Budget] = None,
+                       max_iterations: Optional[int] = None):
+        """
+        Async variant of forward: the same loop, with each LM stage awaited instead of blocking
+        and the local encoder checks run in a worker thread, off the event loop.
+        """
+        steps = self._steps(question, context, initial_answer, on_revision, budget, max_iterations)
+        try:
+            call = next(steps)
+            while True:
+                stage, step, kwargs = call
+                if not isinstance(step, dspy.Module):
+                    call = steps.send(await asyncio.to_thread(step, **kwargs))
+                    continue
+                try:
+                    result = await self._ameasured(stage, step, budget, **kwargs)
+                except DEADLINE_ERRORS as e:
+                    call = steps.throw(e)
+                else:
+                    call = steps.send(result)
+        except StopIteration as done:
+            return done.value
+
+    def _steps(self, question: str, context: List[str], initial_answer: str,
+               on_revision: Optional[Callable[[str], None]], budget: Optional[Budget],
+               max_iterations: Optional[int] = None):
+        """
+        The critic loop as a generator shared by forward and aforward: it yields each step
+        to run as (stage, step, kwargs), receives the step's result, and returns the final
+        dspy.Prediction. Steps are LM stages (dspy.Module) or local CPU-bound checks
+        (plain callables that encode with the sentence-transformer). An LM stage that runs
+        into the request deadline is thrown back in and ends the loop like a budget stop.
+        """
+        max_iterations = self.max_iterations if max_iterations is None else max_iterations
         current_answer = initial_answer
+        score = None
+        best = None # (score, answer) of the best answer the critic has scored
+        stop_reason = "max_iterations"
         history = []
+        num_revisions = 0
+        lm_calls = 0
+        avoided_pairs = 0
+        context_tokens = {"critic": 0, "revision": 0}
+        
+        # 0. Local grounding pre-check: confidently grounded answers skip the LLM critic entirely
+        grounding_check = None
+        if self.grounding:
+            grounding_check = yield ("grounding_check", self._grounding_check, dict(answer=initial_answer, context=context))
+        if grounding_check is not None:
+            print(f"Grounding pre-check: score {grounding_check.score:.2f} "
+                  f"(support {grounding_check.support:.0%}, mean similarity {grounding_check.mean_similarity:.2f})")
+            if self.grounding.should_skip(grounding_check):
+                print(f"Answer grounded locally, skipping LLM critic | skip rate {self.grounding.skip_rate:.0%}")
+                return dspy.Prediction(
+                    final_answer=initial_answer,
+                    history=history,
+                    final_score=round(grounding_check.score * 10, 1), # Same 0-10 scale as the critic
+                    num_revisions=0,
+                    lm_calls=0,
+                    avoided_pairs=0,
+                    context_tokens=context_tokens,
+                    grounding=grounding_check,
+                    critic_skipped=True,
+                    stop_reason="grounded"
+                )
         
-        print(f"\n--- Starting Critic Loop (Max {self.max_iterations} iters) ---")
+        print(f"\n--- Starting Critic Loop (Max {max_iterations} iters) ---")
         
-        for i in range(self.max_iterations):
-            print(f"Iteration {i+1}: Critiquing...")
-            
-            # 1. Critique
-            critique_res = self.critic(question=question, context=context, answer=current_answer)
-            
-            # Robust score parsing
-            import re
-            score_match = re.search(r"(\d+(\.\d+)?)", str(critique_res.score))
-            score = float(score_match.group(1)) if score_match else 0.0
-            
-            history.append({
-                "iteration": i+1,
-                "answer": current_answer,
-                "critique": critique_res.critique,
-                "score": score,
-                "passed": critique_res.passed
-            })
-            
-            print(f"Critique: {critique_res.critique[:100]}...")
-            print(f"Score: {score}/10")
-            
-            # Stop if the critic is happy (score > 8 or passed is True)
-            if score >= 9.0 or str(critique_res.passed).lower() == "true":
-                print("Critique passed! Stopping loop.")
-                break
+        try:
+            for i in range(max_iterations):
+                # Stop early if another round (estimated from measured history) would break the budget
+                if budget is not None:
+                    estimate = self.costs.estimate(["critique_revise"] if self.critique_revise else ["critique", "revision"])
+                    exceeded = budget.exceeded_by(**estimate) if estimate else budget.exceeded_by()
+                    if exceeded:
+                        print(f"Stopping critic loop: another round would exceed the {exceeded} budget.")
+                        stop_reason = f"budget_{exceeded}"
+                        break
+            
+                print(f"Iteration {i+1}: Critiquing...")
+            
+                # 1. Critique (and revise, in combined mode), unless this exact answer was already judged
+                memo_key = self.memo.key(question, context, current_answer) if self.memo else None
+                cached = self.memo.get(memo_key) if self.memo else None
+                combined_res = None
+                if cached is not None:
+                    critique_res = dspy.Prediction(**cached)
+                    print(f"Critique memo hit (hit rate {self.memo.hit_rate:.0%}).")
+                    tracing.event("critic.memo_hit", iteration=i+1, cache_hit=True)
+                    if critique_res.revised_answer is not None:
+                        combined_res = critique_res # The revision it led to is known too
+                else:
+                    if self.critique_revise:
+                        combined_res = yield ("critique_revise", self.critique_revise,
+                                              dict(question=question, context=context, answer=current_answer))
+                        lm_calls += 1
+                        if combined_res is None:
+                            stats = self._count("fallbacks")
+                            print(f"Falling back to separate critique/revision calls "
+                                  f"({stats['fallbacks']} fallbacks, {stats['combined']} combined)")
+                        else:
+                            self._count("combined")
+                
+                    if combined_res is not None:
+                        critique_res = combined_res
+                    else:
+                        critique_res = yield ("critique", self.critic,
+                                              dict(question=question, context=context, answer=current_answer))
+                        lm_calls += 1
+                        critique_res.score = parse_score(critique_res.score)
+                    context_tokens["critic"] += critique_res.get("context_tokens", 0)
+                score = critique_res.score
+            
+                history.append({
+                    "iteration": i+1,
+                    "answer": current_answer,
+                    "critique": critique_res.critique,
+                    "score": score,
+                    "passed": critique_res.passed
+                })
+            
+                print(f"Critique: {critique_res.critique[:100]}...")
+                print(f"Score: {score}/10")
+            
+                passed = score >= 9.0 or str(critique_res.passed).lower() == "true"
+                if best is None or score > best[0]:
+                    best = (score, current_answer)
+                if i == 0 and grounding_check is not None:
+                    # The first verdict judges the same answer the pre-check scored
+                    self.grounding.record_agreement(grounding_check, passed)
+            
+                verdict = {"critique": critique_res.critique, "score": score, "passed": critique_res.passed, "revised_answer": None}
+            
+                # Stop if the critic is happy (score > 8 or passed is True)
+                if passed:
+                    print("Critique passed! Stopping loop.")
+                    stop_reason = "passed"
+                    if cached is not None:
+                        avoided_pairs += 1
+                        self._count("memo_hits")
+                    elif self.memo:
+                        self.memo.put(memo_key, verdict)
+                    break
                 
-            # 2. Revise
-            print("Revising...")
-            revision_res = self.reviser(
-                question=question, 
-                context=context, 
-                past_answer=current_answer, 
-                critique=critique_res.critique
-            )
-            current_answer = revision_res.revised_answer
+                # 2. Revise (the combined call or the memo already returned the revision)
+                previous_answer = current_answer
+                if combined_res is not None:
+                    current_answer = combined_res.revised_answer
+                else:
+                    print("Revising...")
+                    revision_res = yield ("revision", self.reviser, dict(
+                        question=question, 
+                        context=context, 
+                        past_answer=current_answer, 
+                        critique=critique_res.critique
+                    ))
+                    current_answer = revision_res.revised_answer
+                    lm_calls += 1
+                    context_tokens["revision"] += revision_res.get("context_tokens", 0)
+                num_revisions += 1
+                if cached is not None:
+                    avoided_pairs += 1
+                    self._count("memo_hits")
+                elif self.memo:
+                    self.memo.put(memo_key, {**verdict, "revised_answer": current_answer})
+                if on_revision:
+                    # Lets streaming callers swap the revised answer in as soon as it exists
+                    on_revision(current_answer)
+            
+                # 3. Converged: the revision barely changed the answer, so another round would change nothing
+                if i + 1 < max_iterations and (yield ("convergence_check", self._converged,
+                                                      dict(previous_answer=previous_answer, answer=current_answer))):
+                    avoided_pairs += 1
+                    self._count("converged")
+                    print("Revisions converged. Stopping loop.")
+                    tracing.event("critic.converged", iteration=i+1)
+                    stop_reason = "converged"
+                    break
+        except DEADLINE_ERRORS as e:
+            # The stage was abandoned at the deadline: keep what the critic has seen so far
+            print(f"Stopping critic loop: {e}")
+            stop_reason = "budget_deadline"
+        
+        if avoided_pairs:
+            stats = self._count()
+            print(f"Critic/revise pairs avoided: {avoided_pairs} this request | "
+                  f"{stats['memo_hits']} memo hits, {stats['converged']} convergence stops overall")
+        if stop_reason.startswith("budget") and best is not None:
+            # The current answer may be an unscored revision; serve the best one the critic has seen
+            score, current_answer = best
+            if on_revision:
+                on_revision(current_answer)
             
         return dspy.Prediction(
             final_answer=current_answer,
             history=history,
-            final_score=score
+            final_score=score,
+            num_revisions=num_revisions,
+            lm_calls=lm_calls,
+            avoided_pairs=avoided_pairs,
+            context_tokens=context_tokens,
+            grounding=grounding_check,
+            critic_skipped=False,
+            stop_reason=stop_reason
         )
+
+    def _count(self, stat: Optional[str] = None) -> Dict[str, int]:
+        """
+        Increments a shared counter (if given) and returns a snapshot of all of them.
+        """
+        with self._stats_lock:
+            if stat:
+                self.stats[stat] += 1
+            return dict(self.stats)
+
+    def _grounding_check(self, answer: str, context: List[str]):
+        with tracing.span("grounding_check") as grounding_span:
+            grounding_check = self.grounding.score(answer, context)
+            grounding_span.set(score=round(grounding_check.score, 3))
+        return grounding_check
+
+    def _converged(self, previous_answer: str, answer: str) -> bool:
+        """
+        True when a revision left the answer (near-)unchanged: identical up to whitespace,
+        or embedding cosine similarity at or above the convergence threshold.
+        """
+        if " ".join(str(previous_answer).split()) == " ".join(str(answer).split()):
+            return True
+        if self.embedding_model is None:
+            return False
+        vectors = np.asarray(self.embedding_model.encode([str(previous_answer), str(answer)]), dtype=np.float32)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        similarity = float(vectors[0] @ vectors[1])
+        print(f"Revision similarity to previous answer: {similarity:.3f}")
+        return similarity >= self.convergence_threshold
+
+    def _measured(self, stage: str, module: dspy.Module, budget: Optional[Budget] = None, **kwargs):
+        """
+        Runs a stage and records its latency and LM usage for budget estimates.
+        With a budget, the call gets the remaining time as its timeout and is abandoned
+        with TimeoutError at the deadline.
+        """
+        start = time.perf_counter()
+        with tracing.span(f"critic.{stage}") as stage_span, LMUsageMeter() as meter:
+            result = module(**kwargs) if budget is None else budget.call(module, config=budget.lm_config(), **kwargs)
+        stage_span.set_usage(meter.usage)
+        self.costs.record(stage, time.perf_counter() - start, meter.usage)
+        return result
+
+    async def _ameasured(self, stage: str, module: dspy.Module, budget: Optional[Budget] = None, **kwargs):
+        start = time.perf_counter()
+        with tracing.span(f"critic.{stage}") as stage_span, LMUsageMeter() as meter:
+            if budget is None:
+                result = await module.acall(**kwargs)
+            else:
+                result = await budget.acall(module.acall(config=budget.lm_config(), **kwargs))
+        stage_span.set_usage(meter.usage)
+        self.costs.record(stage, time.perf_counter() - start, meter.usage)
+        return result
@@ -0,0 +1,46 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from app.config import Config
+
+class CritiqueMemo:
+    """
+    LRU memo of critic verdicts keyed by a hash of (question, context, answer), shared
+    across iterations and requests. Entries hold the critique, parsed score, pass/fail
+    and, once known, the revision it led to, so a hit can skip the whole critic/revise pair.
+    """
+    def __init__(self, max_size: int = Config.CRITIC_MEMO_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def key(question: str, context: List[str], answer: str) -> str:
+        # Whitespace-only differences in the answer don't change the verdict
+        normalized_answer = " ".join(str(answer).split())
+        payload = "\x1f".join([question, "\x1e".join(str(p) for p in context), normalized_answer])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return dict(entry)
+
+    def put(self, key: str, entry: Dict):
+        with self.lock:
+            self.entries[key] = dict(entry)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
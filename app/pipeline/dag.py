@@ -0,0 +1,141 @@
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List, Optional
+from app.infrastructure import tracing
+from app.pipeline.budget import Budget
+from app.config import Config
+
+class Stage:
+    """
+    One node of the pipeline graph: `fn` is called with its declared inputs as keyword
+    arguments and returns a dict holding its declared outputs.
+    """
+    def __init__(self, name: str, fn: Callable[..., Dict[str, Any]], inputs: List[str], outputs: List[str],
+                 timeout_s: Optional[float] = None):
+        self.name = name
+        self.fn = fn
+        self.inputs = inputs
+        self.outputs = outputs
+        self.timeout_s = timeout_s
+
+def parse_stage_timeouts(spec: str) -> Dict[str, float]:
+    """
+    Parses "understand=15,answer=120" into {"understand": 15.0, "answer": 120.0}.
+    """
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, seconds = item.partition("=")
+        timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+class DagExecutor:
+    """
+    Runs a set of stages as a dependency graph: every stage starts as soon as all of
+    its inputs exist, so independent stages run concurrently on a thread pool.
+    Records per-stage timings and the critical path of each run.
+    Stage timeouts may not exceed the request deadline (deadline_s).
+    """
+    def __init__(self, stages: List[Stage], max_workers: int = Config.PIPELINE_DAG_MAX_WORKERS,
+                 deadline_s: Optional[float] = Config.REQUEST_DEADLINE_S):
+        self.stages = stages
+        self.max_workers = max_workers
+        self._executor = None
+        self._check(stages, deadline_s or None)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage")
+        return self._executor
+
+    def run(self, **initial: Any) -> Dict[str, Any]:
+        """
+        Executes the graph from the initial values. Returns every produced value plus
+        'stage_timings' (name -> start/end ms) and 'critical_path' (stage names).
+        A stage with a timeout gets a budget bounded by it (when it takes `budget`), so its
+        LM calls give up on time. Raises TimeoutError when a stage exceeds its timeout and
+        propagates stage errors; either way queued stages are cancelled (running ones stop
+        at their bounded deadline).
+        """
+        running = {}  # future -> (stage, started_at)
+        try:
+            return self._run(initial, running)
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
+
+    def _run(self, initial: Dict[str, Any], running: Dict) -> Dict[str, Any]:
+        start = time.perf_counter()
+        values = dict(initial)
+        timings: Dict[str, Dict[str, float]] = {}
+        waiting = list(self.stages)
+
+        while waiting or running:
+            for stage in [s for s in waiting if all(name in values for name in s.inputs)]:
+                waiting.remove(stage)
+                kwargs = {name: values[name] for name in stage.inputs}
+                if stage.timeout_s and isinstance(kwargs.get("budget"), Budget):
+                    kwargs["budget"] = kwargs["budget"].bounded(stage.timeout_s)
+                # Copy the caller's context so stage spans nest under the request trace
+                future = self.executor.submit(contextvars.copy_context().run, self._run_stage, stage, kwargs)
+                running[future] = (stage, time.perf_counter())
+
+            if not running:
+                missing = {s.name: [n for n in s.inputs if n not in values] for s in waiting}
+                raise ValueError(f"Pipeline stages can never start, missing inputs: {missing}")
+
+            deadlines = [t0 + s.timeout_s for s, t0 in running.values() if s.timeout_s]
+            timeout = max(0.0, min(deadlines) - time.perf_counter()) if deadlines else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            now = time.perf_counter()
+            for future, (stage, t0) in list(running.items()):
+                if future not in done and stage.timeout_s and now - t0 >= stage.timeout_s:
+                    raise TimeoutError(f"Pipeline stage '{stage.name}' exceeded its {stage.timeout_s}s timeout")
+
+            for future in done:
+                stage, t0 = running.pop(future)
+                outputs = future.result()
+                timings[stage.name] = {"start_ms": (t0 - start) * 1000, "end_ms": (time.perf_counter() - start) * 1000}
+                values.update({name: outputs[name] for name in stage.outputs})
+
+        critical_path = self._critical_path(timings)
+        total_ms = (time.perf_counter() - start) * 1000
+        print(f"Critical path: {' -> '.join(critical_path)} ({total_ms:.0f} ms, "
+              f"{sum(t['end_ms'] - t['start_ms'] for t in timings.values()):.0f} ms of stage time)")
+        values["stage_timings"] = timings
+        values["critical_path"] = critical_path
+        return values
+
+    @staticmethod
+    def _run_stage(stage: Stage, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        with tracing.span(f"stage.{stage.name}"):
+            return stage.fn(**kwargs)
+
+    def _critical_path(self, timings: Dict[str, Dict[str, float]]) -> List[str]:
+        """
+        Walks back from the last stage to finish, each time through the input producer
+        that finished last (the one that actually gated the stage's start).
+        """
+        producers = {output: stage for stage in self.stages for output in stage.outputs}
+        stage = max((s for s in self.stages if s.name in timings), key=lambda s: timings[s.name]["end_ms"], default=None)
+        path = []
+        while stage is not None:
+            path.append(stage.name)
+            gates = [producers[name] for name in stage.inputs if name in producers and producers[name].name in timings]
+            stage = max(gates, key=lambda s: timings[s.name]["end_ms"], default=None)
+        return path[::-1]
+
+    @staticmethod
+    def _check(stages: List[Stage], deadline_s: Optional[float]):
+        names = [s.name for s in stages]
+        if len(names) != len(set(names)):
+            raise ValueError(f"Duplicate pipeline stage names: {names}")
+        outputs = [o for s in stages for o in s.outputs]
+        if len(outputs) != len(set(outputs)):
+            raise ValueError(f"Pipeline stage outputs must be unique: {outputs}")
+        too_long = {s.name: s.timeout_s for s in stages if deadline_s and s.timeout_s and s.timeout_s > deadline_s}
+        if too_long:
+            raise ValueError(f"Pipeline stage timeouts exceed the {deadline_s}s request deadline: {too_long}")
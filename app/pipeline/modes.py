@@ -0,0 +1,33 @@
+from typing import Optional
+from app.config import Config
+
+class PipelineMode:
+    """
+    A quality/latency trade-off applied per request, without rebuilding the pipeline.
+
+    - rewrite:           run the LM query rewrite (otherwise the raw query is searched)
+    - llm_rank:          allow the configured ranker (otherwise vector-score order)
+    - critic_iterations: critic rounds (0 skips the critic, None keeps the configured loop)
+    - best_of_n:         allow best-of-N generation when GENERATION_STRATEGY enables it
+    """
+    def __init__(self, name: str, rewrite: bool, llm_rank: bool, critic_iterations: Optional[int], best_of_n: bool):
+        self.name = name
+        self.rewrite = rewrite
+        self.llm_rank = llm_rank
+        self.critic_iterations = critic_iterations
+        self.best_of_n = best_of_n
+
+PIPELINE_MODES = {
+    "fast": PipelineMode("fast", rewrite=False, llm_rank=False, critic_iterations=0, best_of_n=False),
+    "balanced": PipelineMode("balanced", rewrite=True, llm_rank=True, critic_iterations=1, best_of_n=False),
+    "thorough": PipelineMode("thorough", rewrite=True, llm_rank=True, critic_iterations=None, best_of_n=True),
+}
+
+def get_mode(name: Optional[str] = None) -> PipelineMode:
+    """
+    Looks up a mode by name (PIPELINE_MODE when not given).
+    """
+    name = name or Config.PIPELINE_MODE
+    if name not in PIPELINE_MODES:
+        raise ValueError(f"Unknown pipeline mode '{name}'. Choose from: {', '.join(PIPELINE_MODES)}")
+    return PIPELINE_MODES[name]
@@ -1,69 +1,656 @@
 import dspy
+import time
+import asyncio
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
 from app.infrastructure.milvus_client import MilvusClient
 from app.core.query_understanding import QueryUnderstanding
+from app.core.query_router import QueryRouter
 from app.core.retrieval import RetrieveEvidence
-from app.core.ranker import EvidenceRanker
+from app.core.ranker import build_ranker, CrossEncoderRanker, VectorScoreRanker
 from app.core.generation import AnswerGenerator
+from app.core.extractive import ExtractiveAnswer
 from app.pipeline.critic_loop import MultiAgentCriticLoop
+from app.pipeline.best_of_n import BestOfNGenerator
+from app.core.grounding import GroundingScorer
+from app.pipeline.cascade import RankingCascade
+from app.pipeline.speculative import SpeculativeRetriever
+from app.core.tokens import count_tokens
+from app.core.optimization.feedback import FeedbackManager
+from app.infrastructure.lm_usage import LMUsageMeter
+from app.infrastructure import tracing
+from app.pipeline.budget import Budget, StageCostTracker, DEADLINE_ERRORS
+from app.pipeline.rate_limiter import RateLimiter, RateLimitedLM
+from app.pipeline.dag import DagExecutor, Stage, parse_stage_timeouts
+from app.pipeline.modes import PipelineMode, PIPELINE_MODES, get_mode
+from concurrent.futures import ThreadPoolExecutor
 from app.config import Config
+from typing import List, Dict, Optional, Callable, Tuple
 
 class RAGPipeline(dspy.Module):
-    def __init__(self, output_format: str = "text"):
+    def __init__(self, output_format: str = "text", milvus_client: Optional[MilvusClient] = None):
         super().__init__()
         
-        # Initialize Milvus
-        self.milvus_client = MilvusClient()
+        # Initialize Milvus (or use an injected store with the same interface, e.g. LocalVectorStore)
+        self.milvus_client = milvus_client or MilvusClient()
         
         # Initialize Modules
         self.understand = QueryUnderstanding()
+        self.router = QueryRouter(self.milvus_client.embedding_model) if Config.FASTPATH_ENABLED else None
         self.retrieve = RetrieveEvidence(self.milvus_client, k=10) # Logically retrieve more to rank
-        self.rank = EvidenceRanker()
+        self.speculative = SpeculativeRetriever(self.retrieve) if Config.SPECULATIVE_RETRIEVAL_ENABLED else None
+        self.rank = build_ranker(Config.RERANKER_BACKEND) # 'llm' (EvidenceRanker), 'cross_encoder' or 'vector'
+        # Cheaper tiers the cascade can pick instead of the configured ranker
+        self.cascade = RankingCascade() if Config.RANKING_CASCADE_ENABLED else None
+        self.vector_rank = VectorScoreRanker()
+        self.local_rank = self.rank if isinstance(self.rank, CrossEncoderRanker) else CrossEncoderRanker()
         self.generate = AnswerGenerator(output_format=output_format)
-        self.critic_loop = MultiAgentCriticLoop()
+        # Last degradation tier: answer from the top passages without an LM call
+        self.extractive = ExtractiveAnswer()
+        # Local grounding pre-check lets clearly grounded answers skip the LLM critic
+        grounding = GroundingScorer(self.milvus_client.embedding_model) if Config.GROUNDING_ENABLED else None
+        self.critic_loop = MultiAgentCriticLoop(grounding=grounding, embedding_model=self.milvus_client.embedding_model)
+        # 'best_of_n' replaces generate + serial critic loop with concurrent candidates
+        # (BAML takes its sampling settings from the .baml files, so candidates wouldn't vary)
+        self.best_of_n = None
+        if Config.GENERATION_STRATEGY == "best_of_n" and output_format != "baml":
+            self.best_of_n = BestOfNGenerator(self.generate, self.critic_loop.critic, self.critic_loop.reviser)
+        
+        # Measured stage latencies decide which degradation tier still fits the deadline
+        self.stage_costs = StageCostTracker()
+        self.stage_defaults = parse_stage_timeouts(Config.DEGRADATION_DEFAULT_ESTIMATES)
+        self.tier_counts = Counter()
+        self._tier_lock = threading.Lock()
+        
+        # (event loop, semaphore) capping concurrent aforward requests; see _in_flight_limit
+        self._async_limit = None
+        # 'dag' runs forward as a stage graph so independent stages overlap (see _build_dag)
+        self.dag = self._build_dag() if Config.PIPELINE_EXECUTOR == "dag" else None
+        # Set by warmup once cold-start costs have been paid
+        self.ready = False
         
         # Configure DSPy LM
         # We need to set this up globally or pass it in. For now, setting globally in main.
         
-    def forward(self, user_query: str):
-        # 1. Understand Query
-        understanding = self.understand(user_query=user_query)
+    def forward(self, user_query: str, mode: Optional[str] = None):
+        """
+        Answers one query. `mode` ('fast', 'balanced', 'thorough'; default PIPELINE_MODE)
+        picks the quality/latency trade-off for this request only.
+        """
+        mode = get_mode(mode)
+        budget = Budget() # Request-wide SLO (deadline, tokens, cost), carried through every stage
+        with tracing.trace("rag_pipeline", query=user_query, pipeline_mode=mode.name) as request_trace, budget.meter as meter:
+            if self.dag:
+                values = self.dag.run(user_query=user_query, budget=budget, mode=mode)
+                prediction = values["prediction"]
+                prediction.critical_path = values["critical_path"]
+                prediction.stage_timings = values["stage_timings"]
+            else:
+                evidence = self._gather_evidence(user_query, budget, mode)
+                prediction = self._answer(user_query, evidence, budget, mode)
+        
+        return self._attach_trace(self._attach_usage(prediction, meter), request_trace)
+
+    def batch(self, queries: List[str], max_workers: int = Config.BATCH_MAX_WORKERS,
+              requests_per_second: float = Config.BATCH_REQUESTS_PER_SECOND, mode: Optional[str] = None) -> List[dspy.Prediction]:
+        """
+        Answers many queries (evaluation, cache warming, bulk Q&A) in one call.
+        Retrieval is shared: after the rewrites, every search query of the batch is encoded
+        and searched in batched calls. LM stages run on a pool of max_workers threads, and
+        every LM call they make is rate-limited to requests_per_second.
+        Returns one prediction per query, in input order; a failing query (or a failing
+        search chunk, for the queries it holds) yields a prediction with `error` set instead
+        of failing the batch. `mode` applies to every query.
+        """
+        mode = get_mode(mode)
+        start = time.perf_counter()
+        errors: Dict[int, Exception] = {}
+        
+        def isolated(i: int, fn: Callable, *args):
+            if i in errors:
+                return None
+            try:
+                return fn(*args)
+            except Exception as e:
+                print(f"Batch item {i} failed: {e}")
+                errors[i] = e
+                return None
+        
+        # Every LM call of the batch goes through the limiter, not just each stage start
+        lm = dspy.settings.lm
+        if lm is not None and requests_per_second > 0:
+            lm = RateLimitedLM(lm, RateLimiter(requests_per_second))
+        
+        with dspy.context(lm=lm), LMUsageMeter() as meter, \
+                ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch") as executor:
+            def run_all(fn: Callable) -> List:
+                # Each worker runs in a copy of this context: the LM, usage meter and trace spans carry over
+                futures = [executor.submit(contextvars.copy_context().run, fn, i) for i in range(len(queries))]
+                return [future.result() for future in futures]
+            
+            # 1. Understand every query (fast-path queries skip the LM)
+            planned = [self._plan_understanding(q, None, mode) for q in queries]
+            bypassed = [understanding is not None for understanding in planned]
+            understandings = run_all(lambda i: planned[i] if bypassed[i] else isolated(i, self._understand, queries[i]))
+            time_to_retrieval_ms = (time.perf_counter() - start) * 1000
+            
+            # 2. Shared retrieval: one batched encode + search per chunk of search queries
+            owners, search_queries = [], []
+            for i, understanding in enumerate(understandings):
+                if understanding is not None:
+                    owners += [i] * len(understanding.search_queries)
+                    search_queries += understanding.search_queries
+            retrievals: Dict[int, List[dspy.Prediction]] = {}
+            for offset in range(0, len(search_queries), Config.BATCH_SEARCH_CHUNK):
+                chunk_owners = owners[offset:offset + Config.BATCH_SEARCH_CHUNK]
+                try:
+                    chunk = self.retrieve.search_many(search_queries[offset:offset + Config.BATCH_SEARCH_CHUNK])
+                except Exception as e:
+                    # Only the queries with a search query in this chunk fail
+                    print(f"Batch search chunk at {offset} failed: {e}")
+                    for i in chunk_owners:
+                        errors.setdefault(i, e)
+                    continue
+                for i, retrieval in zip(chunk_owners, chunk):
+                    retrievals.setdefault(i, []).append(retrieval)
+            print(f"Batch retrieval: {len(search_queries)} search queries for {len(queries)} questions "
+                  f"in {-(-len(search_queries) // Config.BATCH_SEARCH_CHUNK)} batched searches")
+            
+            # 3-5. Rank, generate and refine each query
+            def answer(i: int) -> dspy.Prediction:
+                # Only the deadline applies per item: token/cost usage is shared by the whole batch
+                budget = Budget(max_tokens=None, max_cost=None)
+                parts = retrievals[i]
+                retrieval = self.retrieve.fuse(*parts) if len(parts) > 1 else parts[0]
+                with tracing.trace("rag_pipeline.batch_item", query=queries[i], batch_index=i, pipeline_mode=mode.name) as request_trace:
+                    ranking = self._rank(queries[i], retrieval.passages, retrieval.raw_results, budget, mode)
+                    evidence = self._evidence(understandings[i], bypassed[i], retrieval, ranking, time_to_retrieval_ms)
+                    prediction = self._answer(queries[i], evidence, budget, mode)
+                return self._attach_trace(prediction, request_trace)
+            
+            predictions = run_all(lambda i: isolated(i, answer, i))
+        
+        results = []
+        for i, prediction in enumerate(predictions):
+            if i in errors:
+                prediction = dspy.Prediction(user_query=queries[i], answer=None, error=f"{type(errors[i]).__name__}: {errors[i]}")
+            else:
+                prediction.user_query = queries[i]
+                prediction.error = None
+            results.append(prediction)
+        
+        elapsed_s = time.perf_counter() - start
+        usage = meter.usage
+        print(f"Batch done: {len(queries)} queries in {elapsed_s:.1f} s ({len(queries) / max(elapsed_s, 1e-9):.2f} queries/s), "
+              f"{len(errors)} failed | {usage['calls']} LM calls, {usage['prompt_tokens']} prompt tokens")
+        return results
+
+    async def aforward(self, user_query: str, mode: Optional[str] = None):
+        """
+        Async variant of forward (call via `await pipeline.acall(...)`): every stage awaits
+        the LM, Milvus and BAML instead of blocking, so one process can keep many requests
+        in flight. At most ASYNC_MAX_IN_FLIGHT requests run at once; cancelling the awaiting
+        task cancels the request's pending calls.
+        """
+        mode = get_mode(mode)
+        async with self._in_flight_limit():
+            budget = Budget()
+            with tracing.trace("rag_pipeline", query=user_query, mode="async", pipeline_mode=mode.name) as request_trace, \
+                    budget.meter as meter:
+                evidence = await self._agather_evidence(user_query, budget, mode)
+                prediction = await self._aanswer(user_query, evidence, budget, mode)
+            
+            return self._attach_trace(self._attach_usage(prediction, meter), request_trace)
+
+    def stream(self, user_query: str, on_revision: Optional[Callable[[str], None]] = None, mode: Optional[str] = None):
+        """
+        Streaming variant of forward for the chat UI.
+        Yields the partial answer text as tokens arrive, then the final dspy.Prediction.
+        Revised answers from the critic loop are pushed through on_revision.
+        """
+        mode = get_mode(mode)
+        start = time.perf_counter()
+        budget = Budget()
+        with tracing.trace("rag_pipeline", query=user_query, mode="stream", pipeline_mode=mode.name) as request_trace, \
+                budget.meter as meter:
+            evidence = self._gather_evidence(user_query, budget, mode)
+            
+            prediction = None
+            if self._affords(budget, "generate"):
+                try:
+                    if self.best_of_n and mode.best_of_n:
+                        # Candidates are only comparable once complete, so the winner arrives in one piece
+                        with tracing.span("best_of_n", n=self.best_of_n.n):
+                            candidates = self._deadline_call(budget, self.best_of_n, question=user_query, context=evidence.context)
+                        if on_revision and candidates.num_revisions:
+                            # Called here rather than in the deadline-bounded worker thread
+                            on_revision(candidates.final_answer)
+                        prediction = self._refine(user_query, evidence, candidates.generation, budget=budget, mode=mode,
+                                                  critic_result=candidates)
+                        prediction.time_to_first_token_ms = (time.perf_counter() - start) * 1000
+                        yield candidates.generation.answer
+                    else:
+                        # 4. Generate Initial Answer (streamed)
+                        generation = None
+                        time_to_first_token_ms = None
+                        chunks = self.generate.stream(context=evidence.context, question=user_query, config=budget.lm_config())
+                        with tracing.metered_span("generate", streamed=True) as generate_span:
+                            generate_start = time.perf_counter()
+                            # produced_at comes from the thread draining the LM stream, so time
+                            # spent rendering chunks in the UI doesn't count as generation latency
+                            for chunk, produced_at in budget.stream(chunks):
+                                if isinstance(chunk, dspy.Prediction):
+                                    generation = chunk
+                                    self.stage_costs.record("generate", produced_at - generate_start)
+                                    generate_span.set(generate_ms=round((produced_at - generate_start) * 1000, 1))
+                                    continue
+                                if time_to_first_token_ms is None:
+                                    time_to_first_token_ms = (time.perf_counter() - start) * 1000
+                                    generate_span.set(time_to_first_token_ms=round(time_to_first_token_ms, 1))
+                                    print(f"Time to first token: {time_to_first_token_ms:.0f} ms")
+                                yield chunk
+                        
+                        with tracing.span("critic_loop"):
+                            prediction = self._refine(user_query, evidence, generation, on_revision=on_revision, budget=budget, mode=mode)
+                        prediction.time_to_first_token_ms = time_to_first_token_ms
+                except DEADLINE_ERRORS as e:
+                    print(f"Generation ran into the deadline ({e}).")
+            
+            if prediction is None:
+                # No time to generate, or generation ran into the deadline: the extractive answer replaces any partial text
+                prediction = self._extractive_answer(user_query, evidence, budget, mode)
+                prediction.time_to_first_token_ms = (time.perf_counter() - start) * 1000
+                yield prediction.answer
+        
+        yield self._attach_trace(self._attach_usage(prediction, meter), request_trace)
+
+    def warmup(self, prime_questions: int = Config.WARMUP_PRIME_QUESTIONS) -> Dict[str, float]:
+        """
+        Pays the cold-start costs before the first user request: the encoder and Milvus
+        (dummy encode + search), the tokenizer and cross-encoder, and the LM/BAML client
+        with DSPy's first-call overhead (one tiny generation). With prime_questions > 0,
+        the most frequent past questions in the feedback log are answered as a batch,
+        which fills the LM cache, the critic memo and the stage latency estimates.
+        Sets `ready` and returns the duration of each step (ms).
+        """
+        start = time.perf_counter()
+        timings = {"milvus_ms": self.milvus_client.warmup()}
+        
+        step = time.perf_counter()
+        count_tokens("warmup")
+        if self.cascade or isinstance(self.rank, CrossEncoderRanker):
+            self.local_rank(question="warmup", contexts=["warmup"])
+        timings["local_models_ms"] = (time.perf_counter() - step) * 1000
+        
+        # The API key may only be entered later (UI sidebar), so an LM failure doesn't block readiness
+        step = time.perf_counter()
+        try:
+            self.generate(context=["Warmup passage."], question="Is this a warmup?")
+        except Exception as e:
+            print(f"LM warmup failed, the first request will initialize the client: {e}")
+        timings["lm_ms"] = (time.perf_counter() - step) * 1000
+        
+        if prime_questions > 0:
+            step = time.perf_counter()
+            questions = self._frequent_questions(prime_questions)
+            if questions:
+                self.batch(questions)
+            timings["prime_ms"] = (time.perf_counter() - step) * 1000
+        
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+        self.ready = True
+        print("Pipeline ready: " + ", ".join(f"{name} {ms:.0f}" for name, ms in timings.items()))
+        return timings
+
+    @staticmethod
+    def _frequent_questions(limit: int) -> List[str]:
+        """
+        The most frequently asked questions in the feedback log (whitespace-normalized).
+        """
+        counts = Counter(" ".join(e["question"].split()) for e in FeedbackManager().load_examples() if e.get("question"))
+        return [question for question, _ in counts.most_common(limit)]
+
+    def _build_dag(self) -> DagExecutor:
+        """
+        The forward pipeline as a stage graph. Each stage declares its inputs/outputs,
+        so a new overlap is a change to this table rather than to forward. Here the
+        raw-query retrieval (when speculative retrieval is on) runs alongside routing
+        and the LM rewrite.
+        """
+        timeouts = parse_stage_timeouts(Config.PIPELINE_STAGE_TIMEOUTS)
+        
+        def route(user_query, budget, mode):
+            planned = self._plan_understanding(user_query, budget, mode)
+            return {"bypassed": planned is not None, "planned_understanding": planned}
+        
+        def raw_retrieval(user_query):
+            return {"raw_retrieval": self.retrieve(search_query=user_query)}
+        
+        def understand(user_query, planned_understanding, budget):
+            return {"understanding": planned_understanding or self._understand(user_query, budget)}
+        
+        def retrieve(user_query, understanding, raw_retrieval=None):
+            search_queries = understanding.search_queries
+            if raw_retrieval is not None:
+                retrieval = self.speculative.reconcile(raw_retrieval, user_query, search_queries)
+            elif len(search_queries) > 1:
+                retrieval = self.retrieve.fuse(*self.retrieve.search_many(search_queries))
+            else:
+                retrieval = self.retrieve(search_query=understanding.search_query)
+            return {"retrieval": retrieval}
+        
+        def rank(user_query, understanding, bypassed, retrieval, budget, mode):
+            ranking = self._rank(user_query, retrieval.passages, retrieval.raw_results, budget, mode)
+            return {"evidence": self._evidence(understanding, bypassed, retrieval, ranking)}
+        
+        def answer(user_query, evidence, budget, mode):
+            return {"prediction": self._answer(user_query, evidence, budget, mode)}
+        
+        retrieve_inputs = ["user_query", "understanding"]
+        stages = [
+            Stage("route", route, ["user_query", "budget", "mode"], ["bypassed", "planned_understanding"]),
+            Stage("understand", understand, ["user_query", "planned_understanding", "budget"], ["understanding"]),
+        ]
+        if self.speculative:
+            stages.append(Stage("raw_retrieval", raw_retrieval, ["user_query"], ["raw_retrieval"]))
+            retrieve_inputs.append("raw_retrieval")
+        stages += [
+            Stage("retrieve", retrieve, retrieve_inputs, ["retrieval"]),
+            Stage("rank", rank, ["user_query", "understanding", "bypassed", "retrieval", "budget", "mode"], ["evidence"]),
+            Stage("answer", answer, ["user_query", "evidence", "budget", "mode"], ["prediction"]),
+        ]
+        for stage in stages:
+            stage.timeout_s = timeouts.get(stage.name)
+        return DagExecutor(stages)
+
+    def _gather_evidence(self, user_query: str, budget: Optional[Budget] = None,
+                         mode: PipelineMode = PIPELINE_MODES["thorough"]) -> dspy.Prediction:
+        """
+        Steps 1-3: understand the query, retrieve and rank evidence.
+        """
+        start = time.perf_counter()
+        
+        # 1. Understand Query (simple keyword queries and 'fast' mode skip the LM rewrite)
+        understanding = self._plan_understanding(user_query, budget, mode)
+        bypassed = understanding is not None
+        speculative = None
+        if not bypassed:
+            # Retrieve on the raw query while the LM rewrite is in flight
+            speculative = self.speculative.start(user_query) if self.speculative else None
+            understanding = self._understand(user_query, budget)
+        search_query = understanding.search_query
+        search_queries = understanding.search_queries
+        
+        # 2. Retrieve Evidence
+        time_to_retrieval_ms = (time.perf_counter() - start) * 1000
+        print(f"Time to retrieval: {time_to_retrieval_ms:.0f} ms")
+        with tracing.span("retrieve", queries=len(search_queries)) as retrieve_span:
+            if speculative is not None:
+                retrieval = self.speculative.resolve(speculative, user_query, search_queries)
+                retrieve_span.set(speculative=retrieval.speculative_outcome)
+            elif len(search_queries) > 1:
+                # Fan-out: one batched encode + search, fused with reciprocal-rank fusion
+                retrieval = self.retrieve.fuse(*self.retrieve.search_many(search_queries))
+            else:
+                retrieval = self.retrieve(search_query=search_query)
+        
+        # 3. Rank Evidence
+        # All ranker backends return the selected original passages verbatim (top-n).
+        ranking = self._rank(user_query, retrieval.passages, retrieval.raw_results, budget, mode)
+        return self._evidence(understanding, bypassed, retrieval, ranking, time_to_retrieval_ms)
+
+    async def _agather_evidence(self, user_query: str, budget: Optional[Budget] = None,
+                                mode: PipelineMode = PIPELINE_MODES["thorough"]) -> dspy.Prediction:
+        """
+        Async variant of _gather_evidence.
+        """
+        start = time.perf_counter()
+        
+        # The fast-path check encodes the query: keep the CPU work off the event loop
+        understanding = await asyncio.to_thread(self._plan_understanding, user_query, budget, mode)
+        bypassed = understanding is not None
+        speculative = None
+        if not bypassed:
+            # The raw-query retrieval task runs while the rewrite is awaited
+            speculative = self.speculative.astart(user_query) if self.speculative else None
+            try:
+                understanding = await self._aunderstand(user_query, budget)
+            except BaseException:
+                if speculative is not None:
+                    speculative.cancel()
+                raise
         search_query = understanding.search_query
+        search_queries = understanding.search_queries
         
+        time_to_retrieval_ms = (time.perf_counter() - start) * 1000
+        print(f"Time to retrieval: {time_to_retrieval_ms:.0f} ms")
+        with tracing.span("retrieve", queries=len(search_queries)) as retrieve_span:
+            if speculative is not None:
+                retrieval = await self.speculative.aresolve(speculative, user_query, search_queries)
+                retrieve_span.set(speculative=retrieval.speculative_outcome)
+            elif len(search_queries) > 1:
+                retrieval = self.retrieve.fuse(*(await self.retrieve.asearch_many(search_queries)))
+            else:
+                retrieval = await self.retrieve.acall(search_query=search_query)
+        
+        ranking = await self._arank(user_query, retrieval.passages, retrieval.raw_results, budget, mode)
+        return self._evidence(understanding, bypassed, retrieval, ranking, time_to_retrieval_ms)
+
+    def _plan_understanding(self, user_query: str, budget: Optional[Budget],
+                            mode: PipelineMode) -> Optional[dspy.Prediction]:
+        """
+        Decides step 1 without calling the LM. Returns the stand-in understanding (the raw
+        query, searched as-is) when the rewrite is skipped: fast-path queries, 'fast' mode,
+        or no time left for it before the deadline. Returns None when the rewrite should run.
+        """
+        bypassed = self._bypasses_rewrite(user_query, mode)
+        if not bypassed and not self._affords(budget, "understand", "generate"):
+            budget.degrade("no_rewrite")
+            bypassed = True
+        if not bypassed:
+            return None
+        understanding = self._raw_understanding(user_query)
+        self._log_understanding(user_query, understanding)
+        return understanding
+
+    def _understand(self, user_query: str, budget: Optional[Budget] = None) -> dspy.Prediction:
+        """
+        Step 1: the LM rewrite of the query. If the rewrite runs into the request deadline,
+        the raw query is searched instead ('no_rewrite' tier).
+        """
+        try:
+            with tracing.metered_span("understanding"), self._timed("understand"):
+                understanding = self._lm_call(budget, self.understand, user_query=user_query)
+        except DEADLINE_ERRORS as e:
+            understanding = self._rewrite_timed_out(user_query, budget, e)
+        self._log_understanding(user_query, understanding)
+        return understanding
+
+    async def _aunderstand(self, user_query: str, budget: Optional[Budget] = None) -> dspy.Prediction:
+        try:
+            with tracing.metered_span("understanding"), self._timed("understand"):
+                understanding = await self._alm_call(budget, self.understand, user_query=user_query)
+        except DEADLINE_ERRORS as e:
+            understanding = self._rewrite_timed_out(user_query, budget, e)
+        self._log_understanding(user_query, understanding)
+        return understanding
+
+    def _rewrite_timed_out(self, user_query: str, budget: Optional[Budget], error: Exception) -> dspy.Prediction:
+        print(f"Query rewrite ran into the deadline ({error}); searching the raw query.")
+        if budget is not None:
+            budget.degrade("no_rewrite")
+        return self._raw_understanding(user_query)
+
+    @staticmethod
+    def _raw_understanding(user_query: str) -> dspy.Prediction:
+        return dspy.Prediction(search_query=user_query, search_queries=[user_query], intent="lookup", entities="")
+
+    @staticmethod
+    def _evidence(understanding: dspy.Prediction, bypassed: bool, retrieval: dspy.Prediction, ranking: Tuple[str, dspy.Prediction],
+                  time_to_retrieval_ms: Optional[float] = None) -> dspy.Prediction:
+        """
+        Bundles the outputs of steps 1-3 (ranking is the (decision, ranked result) pair of _rank) for the answer stages.
+        """
+        ranking_decision, ranked_res = ranking
+        return dspy.Prediction(
+            understanding=understanding,
+            retrieval=retrieval,
+            raw_context=retrieval.passages,
+            context=ranked_res.ranked_contexts,
+            ranked_res=ranked_res,
+            ranking_decision=ranking_decision,
+            bypassed=bypassed,
+            time_to_retrieval_ms=time_to_retrieval_ms
+        )
+
+    @staticmethod
+    def _log_understanding(user_query: str, understanding: dspy.Prediction):
         print(f"Original Query: {user_query}")
-        print(f"Deep Search Query: {search_query}")
+        print(f"Deep Search Query: {understanding.search_query}")
+        if len(understanding.search_queries) > 1:
+            print(f"Expanded Queries: {understanding.search_queries[1:]}")
         print(f"Intent: {understanding.intent}")
+
+    def _answer(self, user_query: str, evidence: dspy.Prediction, budget: Optional[Budget] = None,
+                mode: PipelineMode = PIPELINE_MODES["thorough"]) -> dspy.Prediction:
+        """
+        Steps 4-5: generates the answer and refines it (or runs best-of-N instead).
+        Falls back to an extractive answer when generation no longer fits the deadline.
+        """
+        if not self._affords(budget, "generate"):
+            return self._extractive_answer(user_query, evidence, budget, mode)
         
-        # 2. Retrieve Evidence
-        retrieval = self.retrieve(search_query=search_query)
-        raw_context = retrieval.passages
+        try:
+            if self.best_of_n and mode.best_of_n:
+                # 4-5. Concurrent candidates scored by the critic
+                with tracing.span("best_of_n", n=self.best_of_n.n):
+                    candidates = self._deadline_call(budget, self.best_of_n, question=user_query, context=evidence.context)
+                return self._refine(user_query, evidence, candidates.generation, budget=budget, mode=mode, critic_result=candidates)
+            
+            # 4. Generate Initial Answer
+            with tracing.metered_span("generate"), self._timed("generate"):
+                generation = self._lm_call(budget, self.generate, context=evidence.context, question=user_query)
+        except DEADLINE_ERRORS as e:
+            print(f"Generation ran into the deadline ({e}).")
+            return self._extractive_answer(user_query, evidence, budget, mode)
         
-        # 3. Rank Evidence
-        ranked_res = self.rank(question=user_query, contexts=raw_context)
-        # Using the output of the ranker. Assuming ranker returns a list or re-ordered string.
-        # For this implementation, we'll assume the ranker returns a prediction that we need to parse 
-        # or we just take the top 5 from the context if the ranker just scores them.
-        # But 'EvidenceRanker' implementation currently returns a ChainOfThought prediction.
-        # We'll use the raw context for now as a fallback if ranker output isn't a clean list, 
-        # but ideally we pass 'ranked_res.ranked_contexts'.
-        # Let's trust the ranker to give us a good string or list. 
-        # For strict typing, we might parse it, but for now let's pass it as context.
-        context = [str(ranked_res.ranked_contexts)] 
-        
-        # 4. Generate Initial Answer
-        generation = self.generate(context=context, question=user_query)
+        with tracing.span("critic_loop"):
+            return self._refine(user_query, evidence, generation, budget=budget, mode=mode)
+
+    async def _aanswer(self, user_query: str, evidence: dspy.Prediction, budget: Budget,
+                       mode: PipelineMode = PIPELINE_MODES["thorough"]) -> dspy.Prediction:
+        """
+        Async variant of _answer.
+        """
+        if not self._affords(budget, "generate"):
+            return self._extractive_answer(user_query, evidence, budget, mode)
+        
+        try:
+            if self.best_of_n and mode.best_of_n:
+                with tracing.span("best_of_n", n=self.best_of_n.n):
+                    candidates = await budget.acall(self.best_of_n.acall(question=user_query, context=evidence.context))
+                return self._refine(user_query, evidence, candidates.generation, budget=budget, mode=mode, critic_result=candidates)
+            
+            # Never wait on the LM past the request deadline
+            timeout = min(Config.GENERATION_TIMEOUT_S, max(budget.remaining_s, 1.0)) \
+                if budget.remaining_s is not None else Config.GENERATION_TIMEOUT_S
+            with tracing.metered_span("generate"), self._timed("generate"):
+                generation = await self.generate.acall(context=evidence.context, question=user_query, timeout=timeout,
+                                                       config=budget.lm_config())
+        except DEADLINE_ERRORS as e:
+            print(f"Generation ran into the deadline ({e}).")
+            return self._extractive_answer(user_query, evidence, budget, mode)
+        
+        if mode.critic_iterations == 0:
+            critic_result = self._skipped_critic(generation.answer, "mode")
+        else:
+            with tracing.span("critic_loop"):
+                critic_result = await self.critic_loop.acall(
+                    question=user_query,
+                    context=evidence.context,
+                    initial_answer=generation.answer,
+                    budget=budget,
+                    max_iterations=mode.critic_iterations
+                )
+        return self._refine(user_query, evidence, generation, budget=budget, mode=mode, critic_result=critic_result)
+
+    def _extractive_answer(self, user_query: str, evidence: dspy.Prediction, budget: Budget,
+                           mode: PipelineMode = PIPELINE_MODES["thorough"]) -> dspy.Prediction:
+        """
+        Last degradation tier: top-passage sentences instead of generation and critique.
+        """
+        budget.degrade("extractive")
+        with tracing.span("extractive"):
+            generation = self.extractive(context=evidence.context, question=user_query)
+        skipped = self._skipped_critic(generation.answer, "extractive")
+        skipped.generation_calls = 0
+        return self._refine(user_query, evidence, generation, budget=budget, mode=mode, critic_result=skipped)
+
+    @staticmethod
+    def _skipped_critic(answer: str, stop_reason: str) -> dspy.Prediction:
+        """
+        A critic-loop result for an answer served without any critique.
+        """
+        return dspy.Prediction(
+            final_answer=answer,
+            history=[],
+            final_score=None,
+            num_revisions=0,
+            lm_calls=0,
+            context_tokens={"critic": 0, "revision": 0},
+            grounding=None,
+            critic_skipped=True,
+            stop_reason=stop_reason
+        )
+
+    def _refine(self, user_query: str, evidence: dspy.Prediction, generation: dspy.Prediction,
+                on_revision: Optional[Callable[[str], None]] = None, budget: Optional[Budget] = None,
+                mode: PipelineMode = PIPELINE_MODES["thorough"], critic_result: Optional[dspy.Prediction] = None) -> dspy.Prediction:
+        """
+        Step 5: runs the critic loop on the initial answer (unless a critic_result, e.g. from
+        best-of-N, is passed in or the mode skips the critic) and assembles the final prediction.
+        """
+        context = evidence.context
         initial_answer = generation.answer
         
         # 5. Critic Loop (Self-Correction)
         # We only run this if the output format is 'text' for now, 
         # as complex struct format might break the critic logic or need a specialized critic.
         # But let's try to run it generally.
-        critic_result = self.critic_loop(
-            question=user_query,
-            context=context,
-            initial_answer=initial_answer
-        )
+        if critic_result is None and mode.critic_iterations == 0:
+            critic_result = self._skipped_critic(initial_answer, "mode")
+        elif critic_result is None:
+            critic_result = self.critic_loop(
+                question=user_query,
+                context=context,
+                initial_answer=initial_answer,
+                on_revision=on_revision,
+                budget=budget,
+                max_iterations=mode.critic_iterations
+            )
         final_answer = critic_result.final_answer
         critic_history = critic_result.history
+        # Only critic scores are comparable across routes; a skipped critic's score is the
+        # grounding pre-check scaled to 10 (or none at all), which would skew the averages
+        if self.router and critic_result.final_score is not None and not critic_result.critic_skipped:
+            self.router.record_outcome(evidence.bypassed, critic_result.final_score)
+        if budget is not None and str(critic_result.stop_reason).startswith("budget") and not critic_history:
+            budget.degrade("no_critic")
+        degradation_tier = self._record_tier(budget)
+        
+        # Every downstream LM call (generate + each critique/revision) re-reads the context
+        token_stats = self._measure_context_tokens(
+            evidence.raw_context, context, downstream_calls=critic_result.get("generation_calls", 1) + critic_result.lm_calls
+        )
+        # Tokens actually sent after per-stage budget packing (see ContextPacker)
+        token_stats["packed_context_tokens"] = {
+            "generation": generation.get("context_tokens", 0),
+            **critic_result.context_tokens
+        }
+        print(f"Context tokens: {token_stats['forwarded_context_tokens']}/{token_stats['retrieved_context_tokens']} "
+              f"per call, ~{token_stats['tokens_saved']} prompt tokens saved across {token_stats['downstream_calls']} calls")
         
         # If we are in TOON/BAML mode, we might want to re-parse the *final* answer 
         # (since revision might have messed up the format key/values if not instructed well)
@@ -72,7 +659,186 @@ class RAGPipeline(dspy.Module):
         return dspy.Prediction(
             answer=final_answer,
             confidence=generation.confidence, # Keep initial confidence or update?
+            sources=generation.get("sources", []),
+            raw_toon=generation.get("raw_toon"),
+            raw_baml=generation.get("raw_baml"),
             context=context,
-            understanding=understanding,
-            critic_history=critic_history
+            understanding=evidence.understanding,
+            critic_history=critic_history,
+            critic_skipped=critic_result.critic_skipped,
+            critic_stop_reason=critic_result.stop_reason,
+            critic_avoided_pairs=critic_result.get("avoided_pairs", 0),
+            grounding_score=critic_result.grounding.score if critic_result.grounding is not None else None,
+            ranked_indices=evidence.ranked_res.ranked_indices,
+            ranking_decision=evidence.ranking_decision,
+            query_bypassed=evidence.bypassed,
+            time_to_retrieval_ms=evidence.time_to_retrieval_ms,
+            speculative_outcome=evidence.retrieval.get("speculative_outcome"),
+            pipeline_mode=mode.name,
+            degradation_tier=degradation_tier,
+            token_stats=token_stats
         )
+
+    def _rank(self, question: str, passages: List[str], raw_results: List[Dict], budget: Optional[Budget] = None,
+              mode: PipelineMode = PIPELINE_MODES["thorough"]):
+        """
+        Routes ranking through the score-gap cascade (when enabled) so that decisive
+        vector scores skip the LLM ranker entirely. The LLM ranker is also skipped in
+        'fast' mode and when it and generation no longer fit the deadline.
+        """
+        decision = self._rank_decision(raw_results, budget, mode)
+
+        with tracing.metered_span("rank", decision=decision):
+            if decision == RankingCascade.SKIP:
+                distances = [hit["score"] for hit in raw_results]
+                return decision, self.vector_rank(question=question, contexts=passages, distances=distances)
+            if decision == RankingCascade.LOCAL:
+                return decision, self.local_rank(question=question, contexts=passages)
+            if Config.RERANKER_BACKEND != "llm":
+                with self._timed("rank"):
+                    return decision, self.rank(question=question, contexts=passages)
+            try:
+                with self._timed("rank_llm"):
+                    return decision, self._lm_call(budget, self.rank, question=question, contexts=passages)
+            except DEADLINE_ERRORS as e:
+                return self._rank_timed_out(question, passages, raw_results, budget, e)
+
+    async def _arank(self, question: str, passages: List[str], raw_results: List[Dict], budget: Optional[Budget] = None,
+                     mode: PipelineMode = PIPELINE_MODES["thorough"]):
+        decision = self._rank_decision(raw_results, budget, mode)
+
+        with tracing.metered_span("rank", decision=decision):
+            if decision == RankingCascade.SKIP:
+                distances = [hit["score"] for hit in raw_results]
+                return decision, await self.vector_rank.acall(question=question, contexts=passages, distances=distances)
+            if decision == RankingCascade.LOCAL:
+                return decision, await self.local_rank.acall(question=question, contexts=passages)
+            if Config.RERANKER_BACKEND != "llm":
+                with self._timed("rank"):
+                    return decision, await self.rank.acall(question=question, contexts=passages)
+            try:
+                with self._timed("rank_llm"):
+                    return decision, await self._alm_call(budget, self.rank, question=question, contexts=passages)
+            except DEADLINE_ERRORS as e:
+                return self._rank_timed_out(question, passages, raw_results, budget, e)
+
+    def _rank_timed_out(self, question: str, passages: List[str], raw_results: List[Dict], budget: Optional[Budget],
+                        error: Exception):
+        """
+        The LLM ranker ran into the deadline: keeps the vector search order ('no_llm_rank' tier).
+        """
+        print(f"LLM ranking ran into the deadline ({error}); keeping the vector order.")
+        if budget is not None:
+            budget.degrade("no_llm_rank")
+        distances = [hit["score"] for hit in raw_results]
+        return RankingCascade.SKIP, self.vector_rank(question=question, contexts=passages, distances=distances)
+
+    def _rank_decision(self, raw_results: List[Dict], budget: Optional[Budget], mode: PipelineMode) -> str:
+        if not mode.llm_rank:
+            return RankingCascade.SKIP
+        decision = self.cascade.decide(raw_results) if self.cascade else RankingCascade.LLM
+        if decision == RankingCascade.LLM and Config.RERANKER_BACKEND == "llm" and not self._affords(budget, "rank_llm", "generate"):
+            budget.degrade("no_llm_rank")
+            return RankingCascade.SKIP
+        return decision
+
+    def _bypasses_rewrite(self, user_query: str, mode: PipelineMode) -> bool:
+        """
+        Whether the query skips the LM rewrite: always in 'fast' mode, otherwise when the router says so.
+        """
+        if not mode.rewrite:
+            return True
+        return self.router.should_bypass(user_query) if self.router else False
+
+    def _affords(self, budget: Optional[Budget], *stages: str) -> bool:
+        """
+        Whether the given stages, at their measured (or default) latency, still fit
+        before the request deadline.
+        """
+        if budget is None or not Config.DEGRADATION_ENABLED:
+            return True
+        return budget.affords(sum(self.stage_costs.seconds(s, self.stage_defaults.get(s, 0.0)) for s in stages))
+
+    @staticmethod
+    def _lm_call(budget: Optional[Budget], module: dspy.Module, **kwargs):
+        """
+        Calls an LM stage with the time left before the deadline as its request timeout,
+        abandoning it with TimeoutError at the deadline.
+        """
+        if budget is None:
+            return module(**kwargs)
+        return budget.call(module, config=budget.lm_config(), **kwargs)
+
+    @staticmethod
+    async def _alm_call(budget: Optional[Budget], module: dspy.Module, **kwargs):
+        if budget is None:
+            return await module.acall(**kwargs)
+        return await budget.acall(module.acall(config=budget.lm_config(), **kwargs))
+
+    @staticmethod
+    def _deadline_call(budget: Optional[Budget], fn: Callable, **kwargs):
+        """
+        Runs a multi-call stage (e.g. best-of-N), abandoning it with TimeoutError at the deadline.
+        """
+        return fn(**kwargs) if budget is None else budget.call(fn, **kwargs)
+
+    @contextmanager
+    def _timed(self, stage: str):
+        """
+        Records the latency of a stage for the degradation estimates (failed calls are not recorded).
+        """
+        start = time.perf_counter()
+        yield
+        self.stage_costs.record(stage, time.perf_counter() - start)
+
+    def _record_tier(self, budget: Optional[Budget]) -> str:
+        tier = budget.tier if budget is not None else "full"
+        with self._tier_lock:
+            self.tier_counts[tier] += 1
+            distribution = ", ".join(f"{name}={count}" for name, count in self.tier_counts.most_common())
+        print(f"Degradation tier: {tier} (served so far: {distribution})")
+        return tier
+
+    def _in_flight_limit(self) -> asyncio.Semaphore:
+        """
+        The semaphore capping concurrent aforward calls, created per event loop
+        (asyncio primitives can't be shared across loops).
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_limit is None or self._async_limit[0] is not loop:
+            self._async_limit = (loop, asyncio.Semaphore(Config.ASYNC_MAX_IN_FLIGHT))
+        return self._async_limit[1]
+
+    @staticmethod
+    def _attach_trace(prediction: dspy.Prediction, request_trace: Optional[tracing.Trace]) -> dspy.Prediction:
+        """
+        Attaches the request's spans (relative to its start) for the Transparent Brain waterfall.
+        """
+        prediction.trace = request_trace.waterfall() if request_trace else []
+        return prediction
+
+    @staticmethod
+    def _attach_usage(prediction: dspy.Prediction, meter: LMUsageMeter) -> dspy.Prediction:
+        """
+        Reports LM usage for the request, including prompt tokens served from the provider's prefix cache.
+        """
+        usage = meter.read() # Also valid while the meter is still active (streaming)
+        cached_share = usage["cached_prompt_tokens"] / usage["prompt_tokens"] if usage["prompt_tokens"] else 0.0
+        print(f"LM usage: {usage['calls']} calls, {usage['prompt_tokens']} prompt tokens "
+              f"({usage['cached_prompt_tokens']} cached, {cached_share:.0%}), {usage['completion_tokens']} completion tokens")
+        prediction.lm_usage = usage
+        return prediction
+
+    @staticmethod
+    def _measure_context_tokens(retrieved: List[str], forwarded: List[str], downstream_calls: int) -> Dict[str, int]:
+        """
+        Compares the tokens of the forwarded top-n passages against sending every retrieved passage.
+        """
+        retrieved_tokens = sum(count_tokens(p) for p in retrieved)
+        forwarded_tokens = sum(count_tokens(p) for p in forwarded)
+        return {
+            "retrieved_context_tokens": retrieved_tokens,
+            "forwarded_context_tokens": forwarded_tokens,
+            "downstream_calls": downstream_calls,
+            "tokens_saved": (retrieved_tokens - forwarded_tokens) * downstream_calls,
+        }
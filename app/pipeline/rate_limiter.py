@@ -0,0 +1,51 @@
+import time
+import asyncio
+import threading
+import dspy
+from typing import Any, Dict, List, Optional
+
+class RateLimiter:
+    """
+    Thread-safe limiter spacing calls evenly at `rate_per_s` (0 disables it).
+    acquire() blocks the calling worker until its slot comes up.
+    """
+    def __init__(self, rate_per_s: float):
+        self.interval = 1.0 / rate_per_s if rate_per_s > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class RateLimitedLM(dspy.BaseLM):
+    """
+    Wraps a DSPy LM so that every call, sync or async, first takes a slot from `limiter`.
+    Install it for a scope with dspy.context(lm=RateLimitedLM(dspy.settings.lm, limiter));
+    threads started with a copy of that context are limited too. Calls that bypass the
+    DSPy LM (BAML) can take a slot through acquire().
+    """
+    def __init__(self, lm: dspy.BaseLM, limiter: RateLimiter):
+        super().__init__(model=lm.model, model_type=getattr(lm, "model_type", "chat"), cache=False)
+        # Same settings as the wrapped LM, so predictors read the same temperature/n
+        self.kwargs = dict(lm.kwargs)
+        self.lm = lm
+        self.limiter = limiter
+
+    def acquire(self):
+        self.limiter.acquire()
+
+    def forward(self, prompt: Optional[str] = None, messages: Optional[List[Dict[str, Any]]] = None, **kwargs):
+        self.limiter.acquire()
+        return self.lm.forward(prompt=prompt, messages=messages, **kwargs)
+
+    async def aforward(self, prompt: Optional[str] = None, messages: Optional[List[Dict[str, Any]]] = None, **kwargs):
+        # Waiting for a slot blocks, so do it off the event loop
+        await asyncio.to_thread(self.limiter.acquire)
+        return await self.lm.aforward(prompt=prompt, messages=messages, **kwargs)
@@ -0,0 +1,115 @@
+import dspy
+import asyncio
+import threading
+import contextvars
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, Future
+from app.core.retrieval import RetrieveEvidence
+from app.config import Config
+from typing import List
+
+class SpeculativeRetriever:
+    """
+    Retrieves on the raw user query while QueryUnderstanding rewrites it.
+    Once the rewrite arrives, the speculative hits are reused when the rewrite is
+    semantically close to the raw query; otherwise the rewrite is retrieved too and
+    both result lists are fused.
+    """
+    def __init__(self, retrieve: RetrieveEvidence, reuse_threshold: float = Config.SPECULATIVE_REUSE_THRESHOLD,
+                 max_workers: int = Config.SPECULATIVE_MAX_WORKERS):
+        self.retrieve = retrieve
+        self.reuse_threshold = reuse_threshold
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock() # Shared by concurrent requests
+        self.stats = {"hits": 0, "misses": 0}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="speculative")
+        return self._executor
+
+    def start(self, user_query: str) -> Future:
+        """
+        Kicks off encode + search for the raw query in the background, in a copy of the
+        caller's context so its spans land in the request's trace.
+        """
+        return self.executor.submit(contextvars.copy_context().run, self.retrieve, search_query=user_query)
+
+    def resolve(self, speculative: Future, user_query: str, search_queries: List[str]) -> dspy.Prediction:
+        """
+        Returns the retrieval for the rewritten query, reusing the speculative one when possible.
+        """
+        return self.reconcile(speculative.result(), user_query, search_queries)
+
+    def astart(self, user_query: str) -> asyncio.Task:
+        """
+        Async variant of start: the raw-query retrieval runs as a task on the running event loop.
+        """
+        return asyncio.create_task(self.retrieve.acall(search_query=user_query))
+
+    async def aresolve(self, speculative: asyncio.Task, user_query: str, search_queries: List[str]) -> dspy.Prediction:
+        spec_res = await speculative
+        # Any follow-up encode/search is blocking, so it runs in a worker thread
+        return await asyncio.to_thread(self.reconcile, spec_res, user_query, search_queries)
+
+    def reconcile(self, spec_res: dspy.Prediction, user_query: str, search_queries: List[str]) -> dspy.Prediction:
+        """
+        The retrieval for the rewritten query, given an already finished raw-query retrieval
+        (e.g. one the DAG executor ran as its own stage).
+        """
+        if len(search_queries) > 1:
+            # Multi-query expansion always needs its own fan-out; the raw-query hits join the fusion
+            retrieval = self.retrieve.fuse(*self.retrieve.search_many(search_queries), spec_res)
+            hit_rate, total = self._count("misses")
+            print(f"Speculative retrieval: fused into {len(search_queries)}-query fan-out | "
+                  f"hit rate {hit_rate:.0%} of {total} queries")
+            retrieval.speculative_outcome = "fused"
+            return retrieval
+
+        search_query = search_queries[0]
+        if search_query.strip().lower() == user_query.strip().lower():
+            similarity = 1.0
+            rewrite_vector = None
+        else:
+            rewrite_vector = self.retrieve.milvus_client.embedding_model.encode(search_query)[0]
+            similarity = self._cosine(spec_res.query_vector, rewrite_vector)
+
+        if similarity >= self.reuse_threshold:
+            retrieval, outcome = spec_res, "hit"
+            hit_rate, total = self._count("hits")
+        else:
+            # The speculative search was not enough on its own: search the rewrite and fuse
+            retrieval, outcome = self.retrieve.fuse(self.retrieve.search_vector(rewrite_vector), spec_res), "miss"
+            hit_rate, total = self._count("misses")
+
+        print(f"Speculative retrieval: {outcome} (similarity {similarity:.2f}) | "
+              f"hit rate {hit_rate:.0%}, waste rate {1 - hit_rate:.0%} of {total} queries")
+        retrieval.speculative_outcome = outcome
+        return retrieval
+
+    def _count(self, outcome: str):
+        """
+        Counts an outcome and returns the (hit rate, total) it leaves, read under the same lock.
+        """
+        with self._lock:
+            self.stats[outcome] += 1
+            total = self.stats["hits"] + self.stats["misses"]
+            return self.stats["hits"] / total, total
+
+    @property
+    def total(self) -> int:
+        with self._lock:
+            return self.stats["hits"] + self.stats["misses"]
+
+    @property
+    def hit_rate(self) -> float:
+        with self._lock:
+            total = self.stats["hits"] + self.stats["misses"]
+            return self.stats["hits"] / total if total else 0.0
+
+    @staticmethod
+    def _cosine(a, b) -> float:
+        a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+        return float(a @ b / max(np.linalg.norm(a) * np.linalg.norm(b), 1e-12))
@@ -2,8 +2,10 @@ import streamlit as st
 import dspy
 from app.config import Config
 from app.pipeline.rag_pipeline import RAGPipeline
+from app.infrastructure.cassette import wrap_lm
 from app.ui.sidebar import render_sidebar
 from app.ui.dashboard import render_dashboard
+from app.ui.trace_view import render_trace_waterfall
 from app.core.optimization.feedback import FeedbackManager
 
 # Initialize Feedback Manager
@@ -18,12 +20,6 @@ st.set_page_config(
 def init_session_state():
     if "messages" not in st.session_state:
         st.session_state.messages = []
-    
-    # Initialize Pipeline if not ready
-    if "rag_pipeline" not in st.session_state:
-        # We start with default 'text' but will update if sidebar changes
-        # Ideally, we allow dynamic config in the pipeline call
-        pass
 
 def main():
     init_session_state()
@@ -45,10 +41,19 @@ def main():
 @st.cache_resource
 def setup_dspy():
     # Initialize DSPy globally once
-    lm = dspy.LM("openai/gpt-4o-mini", api_key=Config.OPENAI_API_KEY)
+    lm = wrap_lm(dspy.LM(Config.LM_MODEL, api_key=Config.OPENAI_API_KEY))
     dspy.configure(lm=lm)
     return lm
 
+@st.cache_resource(show_spinner="Warming up the pipeline...")
+def get_pipeline(output_format: str) -> RAGPipeline:
+    # One pipeline per output format for the whole process, built and warmed once and
+    # shared by every browser session (model loading and first-call overhead are paid here)
+    pipeline = RAGPipeline(output_format=output_format)
+    if Config.WARMUP_ON_START:
+        pipeline.warmup()
+    return pipeline
+
 def main():
     init_session_state()
     setup_dspy()
@@ -69,10 +74,11 @@ def main():
         render_dashboard()
         
     with tab_chat:
-        # Initialize RAG (lazy init or update on change)
-        if "current_format" not in st.session_state or st.session_state.current_format != output_format:
-            st.session_state.rag_pipeline = RAGPipeline(output_format=output_format)
-            st.session_state.current_format = output_format
+        pipeline = get_pipeline(output_format)
+        if pipeline.ready:
+            st.caption("🟢 Pipeline ready")
+        else:
+            st.caption("🟡 Pipeline not warmed up: the first question pays the model loading")
 
         # Chat Interface
         for message in st.session_state.messages:
@@ -80,6 +86,7 @@ def main():
                 st.markdown(message["content"])
                 if "details" in message:
                     with st.expander("🧠 Transparent Brain (Internal Monologue)"):
+                        render_trace_waterfall(message.get("trace", []))
                         st.json(message["details"])
                     if "critic_history" in message and message["critic_history"]:
                         with st.expander("🕵️ Critic Loop (Self-Correction)"):
@@ -105,9 +112,18 @@ def main():
                 
                 with st.spinner("Thinking & retrieving..."):
                     try:
-                        # Run Pipeline
-                        pipeline = st.session_state.rag_pipeline
-                        prediction = pipeline(user_query=prompt)
+                        # Run Pipeline (streamed: tokens render as they arrive)
+                        prediction = None
+                        for chunk in pipeline.stream(
+                            user_query=prompt,
+                            mode=config["mode"],
+                            # The critic loop swaps in each revised answer as soon as it exists
+                            on_revision=lambda revised: message_placeholder.markdown(f"{revised}\n\n*✏️ Revising...*")
+                        ):
+                            if isinstance(chunk, str):
+                                message_placeholder.markdown(chunk + "▌")
+                            else:
+                                prediction = chunk
                         
                         # Display Answer
                         # prediction.answer might be an object if BAML, handled by AnswerGenerator mapping
@@ -119,6 +135,16 @@ def main():
                             "confidence": getattr(prediction, "confidence", "N/A"),
                             "sources": getattr(prediction, "sources", []),
                             "retrieved_context": getattr(prediction, "context", [])[:3], # Show top 3
+                            "ranking_decision": getattr(prediction, "ranking_decision", "N/A"),
+                            "token_stats": getattr(prediction, "token_stats", {}),
+                            "time_to_first_token_ms": getattr(prediction, "time_to_first_token_ms", None),
+                            "lm_usage": getattr(prediction, "lm_usage", {}),
+                            "critic_skipped": getattr(prediction, "critic_skipped", False),
+                            "critic_stop_reason": getattr(prediction, "critic_stop_reason", None),
+                            "critic_avoided_pairs": getattr(prediction, "critic_avoided_pairs", 0),
+                            "grounding_score": getattr(prediction, "grounding_score", None),
+                            "pipeline_mode": getattr(prediction, "pipeline_mode", None),
+                            "degradation_tier": getattr(prediction, "degradation_tier", "full"),
                         }
                         
                         if output_format == "toon":
@@ -126,7 +152,9 @@ def main():
                         elif output_format == "baml":
                              details["raw_format"] = str(getattr(prediction, "raw_baml", "N/A"))
                         
+                        trace = getattr(prediction, "trace", [])
                         with brain_placeholder.expander("🧠 Transparent Brain (Internal Monologue)"):
+                            render_trace_waterfall(trace)
                             st.json(details)
                         
                         # Visualize Critic History
@@ -146,6 +174,7 @@ def main():
                             "role": "assistant", 
                             "content": answer_text,
                             "details": details,
+                            "trace": trace,
                             "critic_history": critic_history
                         })
                         
@@ -178,7 +207,7 @@ def main():
                                 initial_answer=current_answer,
                                 corrected_answer=corrected_answer,
                                 score=score,
-                                metadata={"output_format": st.session_state.current_format}
+                                metadata={"output_format": output_format}
                             )
                             st.success("Feedback saved! This example will be used to compile and optimize the agent.")
 
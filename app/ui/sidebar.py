@@ -1,5 +1,6 @@
 import streamlit as st
 from app.config import Config
+from app.pipeline.modes import PIPELINE_MODES
 
 def render_sidebar():
     with st.sidebar:
@@ -32,4 +33,16 @@ def render_sidebar():
             """
         )
         
-        return {"output_format": output_format}
+        st.divider()
+        
+        # Quality/latency trade-off, applied per request without rebuilding the pipeline
+        st.subheader("⚡ Quality Mode")
+        mode = st.radio(
+            "Pipeline Mode",
+            options=list(PIPELINE_MODES),
+            index=list(PIPELINE_MODES).index(Config.PIPELINE_MODE),
+            horizontal=True,
+            help="Fast: no rewrite, vector ranking, no critic. Balanced: rewrite + one critic pass. Thorough: full pipeline."
+        )
+        
+        return {"output_format": output_format, "mode": mode}
@@ -0,0 +1,31 @@
+import streamlit as st
+import pandas as pd
+import altair as alt
+from typing import List, Dict
+
+def render_trace_waterfall(spans: List[Dict]):
+    """
+    Renders a request's spans (see RAGPipeline._attach_trace) as a latency waterfall.
+    """
+    if not spans:
+        st.caption("No trace recorded (TRACING_ENABLED=false).")
+        return
+
+    df = pd.DataFrame(spans)
+    df["end_ms"] = df["start_ms"] + df["duration_ms"]
+    # Indent child spans and keep each row unique so repeated stages get their own bar
+    df["label"] = [f"{i:02d} {'  ' * depth}{name}" for i, (depth, name) in enumerate(zip(df["depth"], df["name"]))]
+
+    tooltip_fields = [c for c in ["name", "duration_ms", "start_ms", "prompt_tokens", "completion_tokens",
+                                  "cached_prompt_tokens", "decision", "speculative", "cache_hit", "score"] if c in df.columns]
+    chart = alt.Chart(df).mark_bar().encode(
+        x=alt.X("start_ms:Q", title="ms since request start"),
+        x2="end_ms:Q",
+        y=alt.Y("label:N", sort=None, title=None),
+        color=alt.Color("depth:O", legend=None),
+        tooltip=tooltip_fields,
+    ).properties(height=max(120, 22 * len(df)))
+
+    total_ms = df.loc[df["depth"] == 0, "duration_ms"].max()
+    st.markdown(f"**Latency waterfall** ({total_ms:.0f} ms total)")
+    st.altair_chart(chart, use_container_width=True)
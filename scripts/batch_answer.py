@@ -0,0 +1,41 @@
+import sys
+import json
+import dspy
+from app.pipeline.rag_pipeline import RAGPipeline
+from app.infrastructure.cassette import wrap_lm
+from app.config import Config
+
+def setup_dspy():
+    lm = wrap_lm(dspy.LM(Config.LM_MODEL, api_key=Config.OPENAI_API_KEY))
+    dspy.configure(lm=lm)
+
+def run_batch(questions_path: str, output_path: str):
+    """
+    Answers every question in questions_path (one per line) with RAGPipeline.batch
+    and writes one JSON line per question to output_path, in input order.
+    """
+    setup_dspy()
+
+    with open(questions_path, "r") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    print(f"Loaded {len(questions)} questions from {questions_path}.")
+
+    pipeline = RAGPipeline()
+    results = pipeline.batch(questions)
+
+    with open(output_path, "w") as f:
+        for prediction in results:
+            f.write(json.dumps({
+                "question": prediction.user_query,
+                "answer": prediction.answer,
+                "confidence": prediction.get("confidence"),
+                "sources": prediction.get("sources", []),
+                "error": prediction.error,
+            }) + "\n")
+    print(f"Wrote {len(results)} answers to {output_path}.")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python -m scripts.batch_answer <questions.txt> <answers.jsonl>")
+        sys.exit(1)
+    run_batch(sys.argv[1], sys.argv[2])
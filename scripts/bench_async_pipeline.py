@@ -0,0 +1,49 @@
+import dspy
+import time
+import asyncio
+from app.pipeline.rag_pipeline import RAGPipeline
+from app.config import Config
+
+QUERIES = [
+    "What is the core philosophy of DSPy compared to traditional prompting?",
+    "How does Milvus perform similarity search?",
+    "What does retrieval-augmented generation combine?",
+    "How does the system improve its own answers?",
+    "What is agency in AI?",
+]
+
+def setup_dspy():
+    # Uncached, so every request really waits on the provider
+    lm = dspy.LM(Config.LM_MODEL, api_key=Config.OPENAI_API_KEY, cache=False)
+    dspy.configure(lm=lm)
+
+async def run_concurrent(pipeline: RAGPipeline, queries: list) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*[pipeline.acall(user_query=q) for q in queries])
+    return time.perf_counter() - start
+
+def run_benchmark(concurrency: int = 20):
+    setup_dspy()
+    pipeline = RAGPipeline()
+    queries = [QUERIES[i % len(QUERIES)] for i in range(concurrency)]
+
+    # Warm the encoder and the collection
+    pipeline.retrieve(search_query="warmup")
+
+    start = time.perf_counter()
+    for query in queries[:len(QUERIES)]:
+        pipeline(user_query=query)
+    sequential_s = time.perf_counter() - start
+    sequential_qps = len(QUERIES) / sequential_s
+
+    concurrent_s = asyncio.run(run_concurrent(pipeline, queries))
+    concurrent_qps = len(queries) / concurrent_s
+
+    print("\n--- Async Pipeline Benchmark ---")
+    print(f"Sequential forward: {len(QUERIES)} queries in {sequential_s:.1f} s ({sequential_qps:.2f} queries/s)")
+    print(f"Concurrent aforward: {len(queries)} queries in {concurrent_s:.1f} s ({concurrent_qps:.2f} queries/s), "
+          f"max in flight {Config.ASYNC_MAX_IN_FLIGHT}")
+    print(f"Throughput gain: {concurrent_qps / sequential_qps:.1f}x")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,64 @@
+import dspy
+import time
+from app.infrastructure.milvus_client import MilvusClient
+from app.core.retrieval import RetrieveEvidence
+from app.core.generation import AnswerGenerator
+from app.pipeline.critic_loop import MultiAgentCriticLoop
+from app.pipeline.best_of_n import BestOfNGenerator
+from app.config import Config
+
+QUERIES = [
+    "What is the core philosophy of DSPy compared to traditional prompting?",
+    "How does Milvus perform similarity search?",
+    "What does retrieval-augmented generation combine?",
+    "How does the system improve its own answers?",
+    "What is agency in AI?",
+]
+
+def setup_dspy():
+    # The LM cache would make repeated candidates free, so every strategy gets fresh calls
+    lm = dspy.LM(Config.LM_MODEL, api_key=Config.OPENAI_API_KEY, cache=False)
+    dspy.configure(lm=lm)
+
+def run_benchmark(n: int = Config.BEST_OF_N, worker_counts: tuple = (1, 3, 6)):
+    setup_dspy()
+
+    retriever = RetrieveEvidence(MilvusClient(), k=Config.RERANKER_TOP_N)
+    generator = AnswerGenerator()
+    # Plain serial loop as the reference point: separate critique/revision calls like the
+    # best-of-N scoring, no grounding pre-check, and no memo carrying verdicts across queries
+    loop = MultiAgentCriticLoop(mode="separate")
+    loop.memo = None
+    strategies = {
+        f"best-of-{n} ({w} workers)": BestOfNGenerator(generator, loop.critic, loop.reviser, n=n, max_workers=w)
+        for w in worker_counts
+    }
+
+    rows = {name: {"ms": [], "score": []} for name in ["critic loop", *strategies]}
+    for query in QUERIES:
+        passages = retriever(search_query=query).passages
+        print(f"\nQuery: {query}")
+
+        start = time.perf_counter()
+        answer = generator(context=passages, question=query).answer
+        result = loop(question=query, context=passages, initial_answer=answer)
+        rows["critic loop"]["ms"].append((time.perf_counter() - start) * 1000)
+        rows["critic loop"]["score"].append(result.final_score or 0.0)
+
+        for name, strategy in strategies.items():
+            start = time.perf_counter()
+            result = strategy(question=query, context=passages)
+            rows[name]["ms"].append((time.perf_counter() - start) * 1000)
+            rows[name]["score"].append(result.final_score)
+
+        for name, row in rows.items():
+            print(f"  {name}: {row['ms'][-1]:.0f} ms, score {row['score'][-1]}/10")
+
+    print("\n--- Best-of-N vs Critic Loop Benchmark ---")
+    print(f"Queries: {len(QUERIES)}, candidates: {n}")
+    for name, row in rows.items():
+        print(f"{name:<28} mean {sum(row['ms']) / len(row['ms']):.0f} ms | "
+              f"max {max(row['ms']):.0f} ms | mean score {sum(row['score']) / len(row['score']):.1f}/10")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,39 @@
+from app.infrastructure.milvus_client import MilvusClient
+from app.core.retrieval import RetrieveEvidence
+from app.core.context_serializer import serialize_context
+from app.core.tokens import count_tokens
+from app.config import Config
+
+def load_corpus(client: MilvusClient, limit: int = 16384) -> list:
+    return client.collection.query(expr="id >= 0", output_fields=["text", "source"], limit=limit)
+
+def run_benchmark(k: int = Config.RERANKER_TOP_N):
+    client = MilvusClient()
+    retriever = RetrieveEvidence(client, k=k)
+
+    corpus = load_corpus(client)
+    print(f"Loaded {len(corpus)} documents from '{client.collection_name}'.")
+
+    # Each document's own text is used as a query, so every prompt is a realistic top-k window
+    text_total, toon_total, rows = 0, 0, 0
+    for doc in corpus:
+        passages = retriever(search_query=doc["text"]).passages
+        text_tokens = count_tokens(serialize_context(passages, "text"))
+        toon_tokens = count_tokens(serialize_context(passages, "toon"))
+        text_total += text_tokens
+        toon_total += toon_tokens
+        rows += 1
+
+    if not rows:
+        print("Corpus is empty. Index data first (see scripts/verify_pipeline.py).")
+        return
+
+    saving = (text_total - toon_total) / text_total if text_total else 0.0
+    print("\n--- Context Format Benchmark ---")
+    print(f"Prompts: {rows} (top-{k} passages each), tokenizer: {Config.LM_MODEL}")
+    print(f"Plain-text join: {text_total} tokens ({text_total / rows:.0f}/prompt)")
+    print(f"TOON table:      {toon_total} tokens ({toon_total / rows:.0f}/prompt)")
+    print(f"Savings: {text_total - toon_total} tokens ({saving:.1%}) per context copy")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,61 @@
+import dspy
+import time
+import statistics
+from collections import Counter
+from app.infrastructure.milvus_client import MilvusClient
+from app.core.retrieval import RetrieveEvidence
+from app.pipeline.rag_pipeline import RAGPipeline
+from app.pipeline.budget import Budget
+from app.pipeline.modes import PIPELINE_MODES
+from app.config import Config
+
+QUERIES = [
+    "What is the core philosophy of DSPy compared to traditional prompting?",
+    "How does Milvus perform similarity search?",
+    "What does retrieval-augmented generation combine?",
+    "How does the system improve its own answers?",
+    "What is agency in AI?",
+]
+
+def setup_dspy():
+    # Uncached, so every mode pays for its own LM calls
+    lm = dspy.LM(Config.LM_MODEL, api_key=Config.OPENAI_API_KEY, cache=False)
+    dspy.configure(lm=lm)
+
+def run_benchmark(modes: tuple = tuple(PIPELINE_MODES)):
+    """
+    Runs every query in each mode and reports latency, LM cost and degradation tiers per mode.
+    Each mode gets a fresh pipeline (router statistics, stage latency estimates) and the
+    critic memo is off, so no mode reuses work another mode paid for.
+    """
+    setup_dspy()
+    Config.CRITIC_MEMO_SIZE = 0
+    milvus_client = MilvusClient()
+    # Warm the encoder and the collection
+    RetrieveEvidence(milvus_client)(search_query="warmup")
+
+    rows = {mode: {"ms": [], "calls": [], "prompt_tokens": [], "completion_tokens": [], "tiers": Counter()} for mode in modes}
+    for mode in modes:
+        print(f"\n--- Mode: {mode} ---")
+        pipeline = RAGPipeline(milvus_client=milvus_client)
+        for query in QUERIES:
+            start = time.perf_counter()
+            prediction = pipeline(user_query=query, mode=mode)
+            rows[mode]["ms"].append((time.perf_counter() - start) * 1000)
+            for key in ["calls", "prompt_tokens", "completion_tokens"]:
+                rows[mode][key].append(prediction.lm_usage[key])
+            rows[mode]["tiers"][prediction.degradation_tier] += 1
+            print(f"  {query}: {rows[mode]['ms'][-1]:.0f} ms, {prediction.lm_usage['calls']} LM calls, "
+                  f"tier {prediction.degradation_tier}")
+
+    print("\n--- Pipeline Mode Benchmark ---")
+    print(f"Queries: {len(QUERIES)}")
+    for mode, row in rows.items():
+        cost = Budget.cost(sum(row["prompt_tokens"]), sum(row["completion_tokens"])) / len(QUERIES)
+        tiers = ", ".join(f"{tier}={count}" for tier, count in row["tiers"].most_common())
+        print(f"{mode:<10} p50 {statistics.median(row['ms']):.0f} ms | max {max(row['ms']):.0f} ms | "
+              f"{statistics.mean(row['calls']):.1f} LM calls | {statistics.mean(row['prompt_tokens']):.0f} prompt + "
+              f"{statistics.mean(row['completion_tokens']):.0f} completion tokens | ${cost:.5f} per query | tiers {tiers}")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,72 @@
+import dspy
+import time
+from app.infrastructure.milvus_client import MilvusClient
+from app.core.query_understanding import QueryUnderstanding
+from app.core.retrieval import RetrieveEvidence
+from app.config import Config
+
+# (question, source that should be retrieved) over the sample data from scripts/verify_pipeline.py
+LABELED_QUERIES = [
+    ("What is the core philosophy of DSPy compared to traditional prompting?", "dspy_docs"),
+    ("Which database handles scalable similarity search?", "milvus_docs"),
+    ("What does RAG combine to answer questions?", "rag_overview"),
+    ("How does the system get better at answering over time?", "system_design"),
+    ("What does it mean for an autonomous agent to act towards goals?", "ai_concepts"),
+]
+
+def setup_dspy():
+    lm = dspy.LM(Config.LM_MODEL, api_key=Config.OPENAI_API_KEY)
+    dspy.configure(lm=lm)
+
+def recall_at_k(retrieval, expected_source: str, k: int) -> float:
+    return float(any(hit["source"] == expected_source for hit in retrieval.raw_results[:k]))
+
+def run_benchmark(num_queries: int = 3, k: int = 5):
+    setup_dspy()
+
+    retriever = RetrieveEvidence(MilvusClient(), k=k)
+    single = QueryUnderstanding(num_queries=1)
+    multi = QueryUnderstanding(num_queries=num_queries)
+
+    # Warm the encoder and the collection
+    retriever(search_query="warmup")
+
+    rows = []
+    for question, expected_source in LABELED_QUERIES:
+        search_query = single(user_query=question).search_query
+        search_queries = multi(user_query=question).search_queries
+
+        start = time.perf_counter()
+        single_res = retriever(search_query=search_query)
+        single_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        multi_res = retriever.fuse(*retriever.search_many(search_queries))
+        batched_ms = (time.perf_counter() - start) * 1000
+
+        # Reference point: the same fan-out issued as sequential searches
+        start = time.perf_counter()
+        retriever.fuse(*[retriever(search_query=q) for q in search_queries])
+        sequential_ms = (time.perf_counter() - start) * 1000
+
+        rows.append({
+            "single_ms": single_ms,
+            "batched_ms": batched_ms,
+            "sequential_ms": sequential_ms,
+            "single_recall": recall_at_k(single_res, expected_source, k),
+            "multi_recall": recall_at_k(multi_res, expected_source, k),
+        })
+        print(f"\nQuery: {question}")
+        print(f"  Fan-out ({len(search_queries)}): {search_queries}")
+        print(f"  single {single_ms:.0f} ms | batched {batched_ms:.0f} ms | sequential {sequential_ms:.0f} ms")
+
+    mean = lambda key: sum(r[key] for r in rows) / len(rows)
+    print("\n--- Multi-Query Retrieval Benchmark ---")
+    print(f"Queries: {len(rows)}, fan-out: up to {num_queries}, k: {k}")
+    print(f"Single-query latency:        {mean('single_ms'):.0f} ms")
+    print(f"Batched fan-out latency:     {mean('batched_ms'):.0f} ms")
+    print(f"Sequential fan-out latency:  {mean('sequential_ms'):.0f} ms")
+    print(f"Recall@{k} single: {mean('single_recall'):.0%} | multi: {mean('multi_recall'):.0%}")
+
+if __name__ == "__main__":
+    run_benchmark()
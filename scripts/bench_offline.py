@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import statistics
+import dspy
+from collections import defaultdict
+from app.infrastructure.stub_lm import StubLM
+from app.infrastructure.cassette import CassetteLM, get_cassette
+from app.infrastructure.local_vector_store import LocalVectorStore
+from app.core.tokens import token_counting
+from app.config import Config
+
+DOCUMENTS = [
+    ("DSPy is a framework for programming with foundation models. It emphasizes programming over prompting.", "dspy_docs"),
+    ("DSPy optimizers tune prompts and few-shot demonstrations against a metric.", "dspy_docs"),
+    ("Milvus is a high-performance open-source vector database built for scalable similarity search.", "milvus_docs"),
+    ("Milvus indexes such as IVF_FLAT partition vectors into clusters and search the closest ones.", "milvus_docs"),
+    ("Retrieval-Augmented Generation (RAG) combines an information retrieval component with a text generator model.", "rag_overview"),
+    ("RAG grounds answers in retrieved passages, which reduces hallucinations.", "rag_overview"),
+    ("The self-optimizing system uses a critic loop to improve its own answers over time.", "system_design"),
+    ("Human feedback is stored as examples that the optimizer can learn from.", "system_design"),
+    ("Agency in AI refers to the capacity of an autonomous agent to act in an environment to achieve goals.", "ai_concepts"),
+    ("TOON is a compact, token-oriented notation for structured data in prompts.", "formats"),
+]
+
+QUERIES = [
+    "What is the core philosophy of DSPy compared to traditional prompting?",
+    "How does Milvus perform similarity search?",
+    "What does retrieval-augmented generation combine?",
+    "How does the system improve its own answers?",
+    "What is agency in AI?",
+    "How do DSPy optimizers work?",
+    "Why does RAG reduce hallucinations?",
+    "What is TOON used for?",
+]
+
+# Metrics where a higher value is a regression; throughput is the opposite
+LOWER_IS_BETTER = ["p50_ms", "p95_ms", "lm_calls_per_query", "prompt_tokens_per_query"]
+
+def percentile(values: list, q: float) -> float:
+    """
+    Nearest-rank percentile (q in 0-100).
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def build_pipeline(args):
+    # Offline and deterministic: no trace file, no model downloads (cross-encoder),
+    # and no critic memo, which would answer the repeated benchmark queries for free
+    Config.TRACING_ENABLED = True
+    Config.TRACE_FILE = ""
+    Config.RANKING_CASCADE_ENABLED = False
+    Config.RERANKER_BACKEND = "llm"
+    Config.CRITIC_MEMO_SIZE = 0
+    from app.pipeline.rag_pipeline import RAGPipeline
+
+    if args.cassette_mode:
+        # Real LM outputs: recorded live once, then replayed offline
+        live_lm = dspy.LM(Config.LM_MODEL, api_key=Config.OPENAI_API_KEY, cache=False) if args.cassette_mode == "record" else None
+        lm = CassetteLM(live_lm, mode=args.cassette_mode, cassette=get_cassette(args.cassette), latency=args.cassette_latency)
+    else:
+        lm = StubLM(
+            latency_s=args.latency_ms / 1000,
+            latency_per_1k_tokens_s=args.latency_per_1k_tokens_ms / 1000,
+            completion_tokens=args.completion_tokens,
+        )
+    dspy.configure(lm=lm)
+    store = LocalVectorStore(search_latency_s=args.search_latency_ms / 1000)
+    store.insert_documents([text for text, _ in DOCUMENTS], [source for _, source in DOCUMENTS])
+    pipeline = RAGPipeline(milvus_client=store)
+    pipeline.warmup()
+    return pipeline
+
+def measure_sequential(pipeline, queries: list) -> dict:
+    latencies, calls, prompt_tokens = [], [], []
+    stage_tokens = defaultdict(int)
+    for query in queries:
+        start = time.perf_counter()
+        prediction = pipeline(user_query=query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        calls.append(prediction.lm_usage["calls"])
+        prompt_tokens.append(prediction.lm_usage["prompt_tokens"])
+        for span in prediction.trace:
+            if span.get("prompt_tokens"):
+                stage_tokens[span["name"]] += span["prompt_tokens"]
+
+    return {
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "lm_calls_per_query": round(statistics.mean(calls), 2),
+        "prompt_tokens_per_query": round(statistics.mean(prompt_tokens), 1),
+        "prompt_tokens_per_stage": {name: round(tokens / len(queries), 1) for name, tokens in sorted(stage_tokens.items())},
+    }
+
+async def measure_throughput(pipeline, queries: list, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(query):
+        async with semaphore:
+            await pipeline.acall(user_query=query)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[run(q) for q in queries])
+    return round(len(queries) / (time.perf_counter() - start), 2)
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Returns a description of every metric that regressed by more than `threshold` (a fraction).
+    """
+    regressions = []
+    for name in LOWER_IS_BETTER:
+        old, new = baseline["metrics"].get(name), results["metrics"][name]
+        if old and new > old * (1 + threshold):
+            regressions.append(f"{name}: {old} -> {new} (+{(new / old - 1):.0%})")
+    for stage, new in results["metrics"]["prompt_tokens_per_stage"].items():
+        old = baseline["metrics"].get("prompt_tokens_per_stage", {}).get(stage)
+        if old and new > old * (1 + threshold):
+            regressions.append(f"prompt tokens in {stage}: {old} -> {new} (+{(new / old - 1):.0%})")
+    for level, new in results["metrics"]["throughput_qps"].items():
+        old = baseline["metrics"].get("throughput_qps", {}).get(level)
+        if old and new < old * (1 - threshold):
+            regressions.append(f"throughput at concurrency {level}: {old} -> {new} qps ({(new / old - 1):.0%})")
+    return regressions
+
+def run_suite(args) -> int:
+    pipeline = build_pipeline(args)
+    queries = [QUERIES[i % len(QUERIES)] for i in range(args.requests)]
+
+    metrics = measure_sequential(pipeline, queries)
+    metrics["throughput_qps"] = {
+        str(level): asyncio.run(measure_throughput(pipeline, queries, level)) for level in args.concurrency
+    }
+    results = {
+        "settings": {
+            "requests": args.requests,
+            "latency_ms": args.latency_ms,
+            "latency_per_1k_tokens_ms": args.latency_per_1k_tokens_ms,
+            "completion_tokens": args.completion_tokens,
+            "search_latency_ms": args.search_latency_ms,
+            "lm": f"cassette:{args.cassette}:{args.cassette_latency}" if args.cassette_mode else "stub",
+            "generation_strategy": Config.GENERATION_STRATEGY,
+            "pipeline_executor": Config.PIPELINE_EXECUTOR,
+            "pipeline_mode": Config.PIPELINE_MODE,
+            # Offline without cached tiktoken files, tokens are estimated; don't compare across the two
+            "token_counting": token_counting(),
+        },
+        "metrics": metrics,
+    }
+
+    print("\n--- Offline Pipeline Benchmark ---")
+    print(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}.")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != results["settings"]:
+        print("Warning: the baseline was recorded with different settings, comparisons may not be meaningful.")
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\nPerformance regressions (threshold {args.threshold:.0%}):")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+    print(f"\nNo regressions against {args.baseline} (threshold {args.threshold:.0%}).")
+    return 0
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="RAGPipeline benchmark with a stub LM and an in-process vector store")
+    parser.add_argument("--requests", type=int, default=40, help="Queries per measurement")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Concurrency levels for throughput")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Stub LM base latency per call")
+    parser.add_argument("--latency-per-1k-tokens-ms", type=float, default=20, help="Stub LM latency per 1K prompt tokens")
+    parser.add_argument("--completion-tokens", type=int, default=60, help="Completion tokens reported per call")
+    parser.add_argument("--search-latency-ms", type=float, default=5, help="Vector search latency")
+    parser.add_argument("--cassette-mode", choices=["record", "replay"], help="Use a recorded LM cassette instead of the stub LM")
+    parser.add_argument("--cassette", default=Config.LM_CASSETTE_PATH, help="Cassette file")
+    parser.add_argument("--cassette-latency", choices=["recorded", "zero"], default="recorded", help="Replay latency")
+    parser.add_argument("--baseline", default="scripts/baselines/offline.json", help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed regression as a fraction (0.15 = 15%%)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    sys.exit(run_suite(parse_args()))
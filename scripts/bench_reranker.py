@@ -0,0 +1,66 @@
+import dspy
+import time
+from app.infrastructure.milvus_client import MilvusClient
+from app.core.retrieval import RetrieveEvidence
+from app.core.ranker import EvidenceRanker, CrossEncoderRanker
+from app.config import Config
+
+QUERIES = [
+    "What is the core philosophy of DSPy compared to traditional prompting?",
+    "How does Milvus perform similarity search?",
+    "What does retrieval-augmented generation combine?",
+    "How does the system improve its own answers?",
+    "What is agency in AI?",
+]
+
+def setup_dspy():
+    lm = dspy.LM(Config.LM_MODEL, api_key=Config.OPENAI_API_KEY)
+    dspy.configure(lm=lm)
+
+def overlap_at_k(a: list, b: list, k: int) -> float:
+    if not a[:k] or not b[:k]:
+        return 0.0
+    return len(set(a[:k]) & set(b[:k])) / k
+
+def run_benchmark(top_n: int = 3):
+    setup_dspy()
+
+    retriever = RetrieveEvidence(MilvusClient(), k=10)
+    llm_ranker = EvidenceRanker(top_n=10)
+    local_ranker = CrossEncoderRanker(top_n=10, score_cutoff=None)
+
+    # Warm the cross-encoder so model loading isn't counted as ranking latency
+    local_ranker(question="warmup", contexts=["warmup"])
+
+    llm_times, local_times, top1_hits, overlaps = [], [], 0, []
+
+    for query in QUERIES:
+        passages = retriever(search_query=query).passages
+
+        start = time.perf_counter()
+        llm_res = llm_ranker(question=query, contexts=passages)
+        llm_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        local_res = local_ranker(question=query, contexts=passages)
+        local_times.append(time.perf_counter() - start)
+
+        llm_order = llm_res.ranked_indices
+        local_order = local_res.ranked_indices
+
+        top1_hits += int(bool(llm_order) and bool(local_order) and llm_order[0] == local_order[0])
+        overlaps.append(overlap_at_k(llm_order, local_order, top_n))
+
+        print(f"\nQuery: {query}")
+        print(f"  LLM order:   {llm_order[:top_n]} ({llm_times[-1] * 1000:.0f} ms)")
+        print(f"  Local order: {local_order[:top_n]} ({local_times[-1] * 1000:.0f} ms)")
+
+    print("\n--- Reranker Benchmark ---")
+    print(f"Queries: {len(QUERIES)}")
+    print(f"LLM ranker mean latency:   {sum(llm_times) / len(llm_times) * 1000:.0f} ms")
+    print(f"Cross-encoder mean latency: {sum(local_times) / len(local_times) * 1000:.0f} ms")
+    print(f"Top-1 agreement: {top1_hits / len(QUERIES):.0%}")
+    print(f"Overlap@{top_n}: {sum(overlaps) / len(overlaps):.0%}")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,46 @@
+import asyncio
+import time
+import dspy
+from app.core.generation import AnswerGenerator
+from app.config import Config
+
+QUESTIONS = [
+    "How does BAML differ from DSPy in purpose?",
+    "What is Milvus used for?",
+    "What does DSPy emphasize over prompting?",
+    "Which component defines structured LLM outputs?",
+]
+
+CONTEXT = [
+    "DSPy is a framework for programming with foundation models. It emphasizes programming over prompting.",
+    "BAML (Better Agentic Markup Language) is a DSL for defining structured LLM outputs.",
+    "Milvus is a vector database."
+]
+
+async def check_baml_async(concurrency: int = 8):
+    lm = dspy.LM(Config.LM_MODEL, api_key=Config.OPENAI_API_KEY)
+    dspy.configure(lm=lm)
+
+    print("Initializing AnswerGenerator with format='baml'...")
+    generator = AnswerGenerator(output_format="baml")
+
+    questions = (QUESTIONS * concurrency)[:concurrency]
+    print(f"Running {len(questions)} concurrent BAML generations on one event loop...")
+
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *[generator.acall(context=CONTEXT, question=q) for q in questions],
+        return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+
+    for question, result in zip(questions, results):
+        if isinstance(result, Exception):
+            print(f"- {question} -> ERROR: {result}")
+        else:
+            print(f"- {question} -> {result.answer} (confidence {result.confidence})")
+
+    print(f"\nWall-clock for {len(questions)} generations: {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    asyncio.run(check_baml_async())